@@ -0,0 +1,134 @@
+
+"""Binary archive of genomes, appended to every generation.
+
+The file is a 64-byte header followed by fixed-size records, one per
+archived genome::
+
+    header  magic b'GENOMEAR', version, input/hidden/output sizes, genome size
+    record  generation (u4), rank (u4, 0 = best), fitness (f8), weights (f8 x genome size)
+
+All little-endian. Records are only ever appended, so a run can add its top
+genomes after each generation and a reader can ``numpy.memmap`` the whole
+file as a structured array without parsing or copying anything. A record cut
+short by a crash mid-append is ignored by readers and overwritten by the
+next append.
+"""
+
+import os
+import struct
+import numpy as np
+import config
+from genome import Genome, Layout, GENOME_SIZE, layout
+
+MAGIC = b'GENOMEAR'
+VERSION = 1
+HEADER_SIZE = 64
+_HEADER = struct.Struct('<8sIIIII')
+
+
+def record_dtype(genome_size=GENOME_SIZE):
+    return np.dtype([('generation', '<u4'), ('rank', '<u4'), ('fitness', '<f8'),
+                     ('weights', '<f8', (genome_size,))])
+
+
+def _read_header(f):
+    magic, version, inputs, hidden, outputs, genome_size = _HEADER.unpack(f.read(HEADER_SIZE)[:_HEADER.size])
+    if magic != MAGIC:
+        raise ValueError(f"Not a genome archive: {f.name}")
+    if version != VERSION:
+        raise ValueError(f"Unsupported genome archive version {version}: {f.name}")
+    return (inputs, hidden, outputs), genome_size
+
+
+class GenomeArchive:
+    """Appends the ``top`` genomes of each generation to ``path``.
+
+    An existing archive is appended to, provided it was written for the same
+    network shape (taken from ``settings``; default: config). Pass an
+    instance to ``Simulation(archive=...)`` and ``evolve`` records every
+    generation into it. ``start`` is the number of records that were
+    already in the file when it was opened, i.e. where this run's own
+    records begin.
+    """
+
+    def __init__(self, path, top=None, settings=None):
+        settings = settings if settings is not None else config
+        self.path = path
+        self.top = settings.ELITISM_COUNT if top is None else top
+        self.layout = layout(settings)
+        self.dtype = record_dtype(self.layout.size)
+        shape = self.layout.shape
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, 'rb') as f:
+                archived, _ = _read_header(f)
+            if archived != shape:
+                raise ValueError(f"{path} holds {archived} networks, not {shape}")
+            self.file = open(path, 'r+b')
+            # Drop a partial trailing record
+            self.file.truncate(HEADER_SIZE + len(self) * self.dtype.itemsize)
+            self.file.seek(0, os.SEEK_END)
+        else:
+            self.file = open(path, 'wb')
+            self.file.write(_HEADER.pack(MAGIC, VERSION, *shape, self.layout.size).ljust(HEADER_SIZE, b'\0'))
+            self.file.flush()
+        self.start = len(self)
+
+    def __len__(self):
+        return (os.path.getsize(self.path) - HEADER_SIZE) // self.dtype.itemsize
+
+    def append(self, generation, fitness, weights):
+        # fitness/weights for one generation, best first; keeps the top ones
+        count = min(self.top, len(fitness))
+        records = np.zeros(count, dtype=self.dtype)
+        records['generation'] = generation
+        records['rank'] = np.arange(count)
+        records['fitness'] = fitness[:count]
+        records['weights'] = weights[:count]
+        self.file.write(records.tobytes())
+        self.file.flush()
+
+    def rewind(self, generation, start=0):
+        # Drop records from `generation` on, e.g. ones written after the
+        # checkpoint a run is being resumed from. Only the run whose records
+        # begin at record `start` is searched: an archive shared by several
+        # runs isn't sorted by generation as a whole
+        self.file.flush()
+        generations = load_archive(self.path)['generation']
+        start = min(start, len(generations))
+        keep = start + int(np.searchsorted(generations[start:], generation))
+        del generations
+        self.file.truncate(HEADER_SIZE + keep * self.dtype.itemsize)
+        self.file.seek(0, os.SEEK_END)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_archive(path):
+    # Read-only structured memmap of every complete record in the archive
+    with open(path, 'rb') as f:
+        _, genome_size = _read_header(f)
+    dtype = record_dtype(genome_size)
+    count = (os.path.getsize(path) - HEADER_SIZE) // dtype.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=HEADER_SIZE, shape=(count,))
+
+
+def archive_layout(path):
+    # Layout of the networks stored in an archive
+    with open(path, 'rb') as f:
+        shape, _ = _read_header(f)
+    return Layout(*shape)
+
+
+def archived_genome(records, i, shape=None):
+    # Genome for record i (copied out of the read-only map); pass the
+    # archive_layout for archives of non-default networks
+    return Genome.view(np.array(records['weights'][i], dtype=float), shape or layout())
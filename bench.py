@@ -0,0 +1,230 @@
+
+"""Benchmark suite for the simulation hot paths.
+
+Covers Genome.feed_forward (scalar and batched), Bot.sense (scalar and the
+ray kernel), Simulation.update and a full generation (run_generation +
+evolve), each over a grid of population size, food count, obstacle count
+and hidden size. Everything runs headless from fixed seeds:
+
+    python -m bench --pop 100 1000 --obstacles 5 200 --out bench.json
+    python -m bench --compare bench.json --threshold 0.1
+
+Results are saved as JSON. ``--compare`` reports cases whose throughput
+dropped by more than ``--threshold`` against a saved baseline and exits
+non-zero if there are any. Each hidden size is a ``config.Settings``
+handed to the benchmarked objects.
+"""
+
+import argparse
+import itertools
+import json
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+import config
+import sensors
+from genome import GenomeStack, random_weights
+from simulation import Simulation
+
+SEED = 12345
+
+
+def _measure(fn, min_time):
+    # Call fn() until min_time has elapsed; fn returns the work units it did
+    units = 0
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        units += fn()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return calls, units, elapsed
+
+
+def bench_feed_forward(pop, min_time, settings):
+    rng = np.random.default_rng(SEED)
+    stack = GenomeStack(random_weights(pop, rng, settings), settings)
+    inputs = rng.uniform(-1, 1, (pop, settings.INPUT_SIZE))
+    idx = np.arange(pop)
+    genome = stack[0]
+    row = inputs[0]
+
+    def scalar():
+        genome.feed_forward(row)
+        return 1
+
+    def batched():
+        stack.feed_forward(inputs, idx)
+        return pop
+
+    _, scalar_calls, scalar_time = _measure(scalar, min_time)
+    _, bot_evals, batched_time = _measure(batched, min_time)
+    return {
+        'scalar_calls_per_sec': scalar_calls / scalar_time,
+        'bot_evals_per_sec': bot_evals / batched_time,
+    }
+
+
+def bench_sense(pop, obstacles, min_time, settings):
+    sim = Simulation(population_size=pop, verbose=False, seed=SEED, obstacle_count=obstacles, settings=settings)
+    state = sim.state
+    state.angle[:] = sim.rng.uniform(-np.pi, np.pi, pop)
+    bot = sim.population[0]
+
+    def scalar():
+        bot.sense(sim.obstacles, sim.foods)
+        return 1
+
+    def batched():
+        angles = state.angle[:, None] + sim.ray_angles
+        if len(sim.obstacle_radius) < settings.OBSTACLE_GRID_MIN:
+            sensors.cast_rays(state.pos, angles, sim.obstacle_pos, sim.obstacle_radius, settings.SIGHT_RANGE)
+        else:
+            sim.obstacle_grid.raycast_many(state.pos, angles, settings.SIGHT_RANGE)
+        return pop
+
+    _, scalar_calls, scalar_time = _measure(scalar, min_time)
+    _, bot_senses, batched_time = _measure(batched, min_time)
+    return {
+        'scalar_calls_per_sec': scalar_calls / scalar_time,
+        'bot_senses_per_sec': bot_senses / batched_time,
+    }
+
+
+def bench_update(pop, food, obstacles, min_time, settings):
+    sims = []
+
+    def step():
+        # Restart from the same seeded world whenever everyone has died
+        if not sims or not sims[0].state.alive.any():
+            sims[:] = [Simulation(population_size=pop, verbose=False, seed=SEED,
+                                  food_count=food, obstacle_count=obstacles, settings=settings)]
+        alive = int(sims[0].state.alive.sum())
+        sims[0].update()
+        return alive
+
+    steps, bot_steps, elapsed = _measure(step, min_time)
+    return {
+        'steps_per_sec': steps / elapsed,
+        'bot_steps_per_sec': bot_steps / elapsed,
+    }
+
+
+def bench_generation(pop, food, obstacles, steps, min_time, settings):
+    sim = Simulation(population_size=pop, verbose=False, seed=SEED,
+                     food_count=food, obstacle_count=obstacles, settings=settings)
+
+    def generation():
+        sim.run_generation(steps)
+        sim.evolve()
+        return 1
+
+    generations, _, elapsed = _measure(generation, min_time)
+    return {'generations_per_min': generations / elapsed * 60}
+
+
+# name -> (function, parameters it depends on, metric used for comparisons)
+BENCHMARKS = {
+    'feed_forward': (bench_feed_forward, ('pop',), 'bot_evals_per_sec'),
+    'sense': (bench_sense, ('pop', 'obstacles'), 'bot_senses_per_sec'),
+    'update': (bench_update, ('pop', 'food', 'obstacles'), 'bot_steps_per_sec'),
+    'generation': (bench_generation, ('pop', 'food', 'obstacles', 'steps'), 'generations_per_min'),
+}
+
+
+def run_suite(names, grid, min_time, settings):
+    # Every benchmark over its own parameters' cross product
+    results = []
+    for name in names:
+        fn, params, _ = BENCHMARKS[name]
+        for values in itertools.product(*(grid[p] for p in params)):
+            case = dict(zip(params, values))
+            metrics = fn(min_time=min_time, settings=settings, **case)
+            case['hidden'] = settings.HIDDEN_SIZE
+            results.append({'name': name, 'params': case, 'metrics': metrics})
+            print(f"{name:<13} {case}  " + "  ".join(f"{k}={v:,.1f}" for k, v in metrics.items()),
+                  flush=True)
+    return results
+
+
+def run_all(names, grid, hidden_sizes, min_time):
+    results = []
+    for hidden in hidden_sizes:
+        results.extend(run_suite(names, grid, min_time, config.Settings(HIDDEN_SIZE=hidden)))
+    return results
+
+
+def _key(result):
+    return result['name'], json.dumps(result['params'], sort_keys=True)
+
+
+def compare(results, baseline, threshold):
+    # Regressions: cases whose primary metric fell by more than threshold
+    base = {_key(r): r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        old = base.get(_key(result))
+        if old is None:
+            continue
+        metric = BENCHMARKS[result['name']][2]
+        before, after = old['metrics'][metric], result['metrics'][metric]
+        change = (after - before) / before if before else 0.0
+        line = f"{result['name']:<13} {result['params']}  {metric}: {before:,.1f} -> {after:,.1f} ({change:+.1%})"
+        if change < -threshold:
+            regressions.append(line)
+            line += "  REGRESSION"
+        print(line)
+    return regressions
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='bench', description=__doc__.splitlines()[0])
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument('--pop', nargs='+', type=int, default=[100, 1000])
+    parser.add_argument('--food', nargs='+', type=int, default=[config.FOOD_COUNT])
+    parser.add_argument('--obstacles', nargs='+', type=int, default=[config.OBSTACLE_COUNT])
+    parser.add_argument('--hidden', nargs='+', type=int, default=[config.HIDDEN_SIZE])
+    parser.add_argument('--steps', nargs='+', type=int, default=[100],
+                        help='steps per generation for the generation benchmark')
+    parser.add_argument('--min-time', type=float, default=0.5, help='seconds spent per case')
+    parser.add_argument('--out', default=None, help='write results to this JSON file')
+    parser.add_argument('--compare', default=None, help='baseline JSON to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='allowed fractional slowdown before a case counts as a regression')
+    args = parser.parse_args(argv)
+
+    grid = {'pop': args.pop, 'food': args.food, 'obstacles': args.obstacles, 'steps': args.steps}
+    results = run_all(args.only, grid, args.hidden, args.min_time)
+
+    report = {
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'seed': SEED,
+        'results': results,
+    }
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
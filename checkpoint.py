@@ -0,0 +1,82 @@
+
+"""Checkpoint and resume of evolution runs.
+
+A checkpoint is taken at a generation boundary (after ``Simulation.evolve``)
+and holds everything the next generation depends on: the population's
+weight matrix and start positions, the generation counter, the RNG state,
+the simulation's settings and the obstacle and food layout. It is a single uncompressed ``.npz``
+written to a temporary file and renamed into place, so a run killed
+mid-write never leaves a truncated checkpoint behind.
+"""
+
+import json
+import os
+import tempfile
+import numpy as np
+import config
+from genome import GenomeStack
+from simulation import Simulation
+
+
+def _file_mode(path):
+    # The existing file's permissions, else the umask default for new files
+    try:
+        return os.stat(path).st_mode & 0o777
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+def save_checkpoint(path, sim, extra=None):
+    # extra: JSON-serialisable run metadata (e.g. the runner's seed)
+    meta = {
+        'generation': sim.generation,
+        'rng_state': sim.rng.bit_generator.state,
+        'settings': config.Settings().as_dict() if sim.settings is config else sim.settings.as_dict(),
+        'extra': extra or {},
+    }
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.checkpoint-', suffix='.npz')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f,
+                     meta=np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8),
+                     weights=sim.state.genomes.weights,
+                     start_pos=sim.state.pos,
+                     obstacle_pos=sim.obstacle_pos,
+                     obstacle_vel=sim.obstacle_vel,
+                     obstacle_radius=sim.obstacle_radius,
+                     food_pos=sim.food_pos,
+                     food_energy=sim.food_energy)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp creates the file 0600; give it the mode a plain write would
+        os.chmod(tmp, _file_mode(path))
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def load_checkpoint(path, **sim_kwargs):
+    # Returns (sim, extra); sim continues exactly where the saved run left
+    # off, with the settings it was saved with unless settings= is passed
+    with np.load(path) as data:
+        meta = json.loads(data['meta'].tobytes().decode())
+        weights = data['weights']
+        sim_kwargs.setdefault('food_count', len(data['food_pos']))
+        sim_kwargs.setdefault('obstacle_count', len(data['obstacle_pos']))
+        if 'settings' in meta:
+            sim_kwargs.setdefault('settings', config.Settings(**meta['settings']))
+        settings = sim_kwargs.get('settings')
+        sim = Simulation(genomes=GenomeStack(weights, settings), **sim_kwargs)
+        sim.rng.bit_generator.state = meta['rng_state']
+        sim.generation = meta['generation']
+        sim.set_obstacles([{'pos': pos, 'vel': vel, 'radius': float(radius)}
+                           for pos, vel, radius in zip(data['obstacle_pos'], data['obstacle_vel'],
+                                                       data['obstacle_radius'])])
+        sim.set_foods([{'pos': pos, 'energy': float(energy)}
+                       for pos, energy in zip(data['food_pos'], data['food_energy'])])
+        sim.spawn_population(GenomeStack(weights, settings), start_pos=data['start_pos'])
+    return sim, meta['extra']
@@ -1,37 +1,146 @@
-
-# Simulation Constants
-POPULATION_SIZE = 20
-GENERATIONS = 100
-SIMULATION_STEPS = 400  # Increased steps to allow time for foraging
-
-# Physics & Environment
-FLUID_SCALE = 50.0      # Scale for sine wave flow field
-FLUID_STRENGTH = 0.5    # Max force of the flow
-DRAG_COEFFICIENT = 0.05
-MAX_SPEED = 5.0
-THRUST_POWER = 0.5
-OBSTACLE_SPEED = 1.0
-
-# Energy System
-STARTING_ENERGY = 100.0
-ENERGY_CONSUMPTION_RATE = 0.1  # Per frame
-THRUST_ENERGY_COST = 0.05      # Per unit of thrust
-FOOD_ENERGY_VALUE = 50.0
-FOOD_COUNT = 10
-
-# Neural Network Inputs
-# 3 Raycasts + 2 Velocity + 2 Fluid Force + 2 Nearest Food Vector + 1 Energy Level
-INPUT_SIZE = 10
-HIDDEN_SIZE = 12
-OUTPUT_SIZE = 2  # Thrust Left/Right (-1 to 1), Thrust Forward (0 to 1)
-
-# Genetic Algorithm
-MUTATION_RATE = 0.1
-MUTATION_AMOUNT = 0.5
-ELITISM_COUNT = 2
-
-# Visualization
-SCREEN_WIDTH = 800
-SCREEN_HEIGHT = 600
-OFFSET_X = 0
-OFFSET_Y = 0
+
+# Simulation Constants
+POPULATION_SIZE = 20
+GENERATIONS = 100
+SIMULATION_STEPS = 400  # Increased steps to allow time for foraging
+
+# Physics & Environment
+FLUID_SCALE = 50.0      # Scale for sine wave flow field
+FLUID_STRENGTH = 0.5    # Max force of the flow
+FLOW_FIELD = 'analytic' # 'analytic' or 'grid' (sampled once, bilinear lookups)
+FLOW_GRID_SPACING = 10.0
+DRAG_COEFFICIENT = 0.05
+MAX_SPEED = 5.0
+THRUST_POWER = 0.5
+OBSTACLE_SPEED = 1.0
+OBSTACLE_COUNT = 5
+GRID_CELL_SIZE = 50.0   # Spatial hash cell size for food/obstacle queries
+PHYSICS_DT = 1.0        # Simulated time per step
+PHYSICS_SUBSTEPS = 1    # Integration substeps per step
+INTEGRATOR = 'euler'    # 'euler' (semi-implicit) or 'verlet'
+BACKEND = 'numpy'       # Step engine: 'numpy' (vectorized passes) or 'numba' (one fused kernel, see kernels.py)
+
+# Chunked World (see world.py)
+WORLD_WIDTH = 0            # Arena size; 0 on both keeps the classic screen-sized world,
+WORLD_HEIGHT = 0           # 0 on one axis means the screen's size along it
+WORLD_CHUNK_SIZE = 400.0   # Side of one lazily generated chunk
+WORLD_CHUNK_FOOD = 5       # Food items per chunk
+WORLD_CHUNK_OBSTACLES = 2  # Obstacles per chunk, each bouncing inside it
+
+# Energy System
+STARTING_ENERGY = 100.0
+ENERGY_CONSUMPTION_RATE = 0.1  # Per frame
+THRUST_ENERGY_COST = 0.05      # Per unit of thrust
+FOOD_ENERGY_VALUE = 50.0
+FOOD_COUNT = 10
+FOOD_CONFLICT = 'nearest'      # Food reached by several bots in a step: the 'nearest' eats it, or they 'split' it
+
+# Sensors
+RAY_COUNT = 3           # Raycasts spread evenly across RAY_SPREAD
+RAY_SPREAD = 90.0       # Degrees between the outermost rays (-45 to +45)
+SIGHT_RANGE = 200.0
+OBSTACLE_GRID_MIN = 64  # Below this, rays and collisions test every obstacle directly
+
+# Neural Network Inputs
+# Raycasts + 2 Velocity + 2 Fluid Force + 2 Nearest Food Vector + 1 Energy Level
+INPUT_SIZE = RAY_COUNT + 7
+HIDDEN_SIZE = 12
+OUTPUT_SIZE = 2  # Thrust Left/Right (-1 to 1), Thrust Forward (0 to 1)
+
+# Genetic Algorithm
+MUTATION_RATE = 0.1
+MUTATION_AMOUNT = 0.5
+ELITISM_COUNT = 2
+SELECTION = 'tournament'  # Parent selection: 'tournament', 'rank' or 'truncation'
+TOURNAMENT_SIZE = 3       # Bots per tournament
+TRUNCATION_FRACTION = 0.2 # Share of the population 'truncation' picks parents from
+
+# Island Model
+MIGRATION_TOPOLOGY = 'ring'  # 'ring' or 'random' (a fresh random cycle each time)
+MIGRATION_INTERVAL = 5       # Generations between migrations
+MIGRANT_COUNT = 2            # Best genomes each island sends per migration
+
+# Multi-Episode Evaluation
+EPISODE_AGGREGATE = 'mean'  # How episode scores combine: 'mean', 'min' or 'quantile'
+EPISODE_QUANTILE = 0.25     # Used by 'quantile'
+
+# Fitness Cache
+FITNESS_CACHE_SIZE = 100000  # (genome, world seed) results kept, least recently used evicted
+
+# Telemetry
+TELEMETRY_PORT = 8765
+TELEMETRY_QUEUE_SIZE = 64  # Records buffered per WebSocket client before the oldest are dropped
+
+# Visualization
+SCREEN_WIDTH = 800
+SCREEN_HEIGHT = 600
+OFFSET_X = 0
+OFFSET_Y = 0
+REPLAY_CHUNK_FRAMES = 100  # Recorded steps per replay file chunk
+
+
+# Names of the tunables above that a Settings object carries
+TUNABLES = (
+    'POPULATION_SIZE', 'GENERATIONS', 'SIMULATION_STEPS',
+    'FLUID_SCALE', 'FLUID_STRENGTH', 'FLOW_FIELD', 'FLOW_GRID_SPACING', 'DRAG_COEFFICIENT', 'MAX_SPEED',
+    'THRUST_POWER', 'OBSTACLE_SPEED', 'OBSTACLE_COUNT', 'GRID_CELL_SIZE', 'PHYSICS_DT', 'PHYSICS_SUBSTEPS',
+    'INTEGRATOR', 'BACKEND',
+    'WORLD_WIDTH', 'WORLD_HEIGHT', 'WORLD_CHUNK_SIZE', 'WORLD_CHUNK_FOOD', 'WORLD_CHUNK_OBSTACLES',
+    'STARTING_ENERGY', 'ENERGY_CONSUMPTION_RATE', 'THRUST_ENERGY_COST',
+    'FOOD_ENERGY_VALUE', 'FOOD_COUNT', 'FOOD_CONFLICT',
+    'RAY_COUNT', 'RAY_SPREAD', 'SIGHT_RANGE', 'OBSTACLE_GRID_MIN',
+    'HIDDEN_SIZE', 'OUTPUT_SIZE',
+    'MUTATION_RATE', 'MUTATION_AMOUNT', 'ELITISM_COUNT', 'SELECTION', 'TOURNAMENT_SIZE', 'TRUNCATION_FRACTION',
+    'SCREEN_WIDTH', 'SCREEN_HEIGHT',
+)
+
+
+class Settings:
+    """The tunables above as an instantiable, picklable object.
+
+    ``Settings()`` starts from this module's values (as they are when it is
+    created) and keyword arguments override them by name, e.g.
+    ``Settings(FLUID_STRENGTH=0.8, HIDDEN_SIZE=16)``. Simulation, Bot,
+    Genome and the code under them read from the instance they are given,
+    so differently configured simulations can share one process.
+    """
+
+    def __init__(self, **overrides):
+        unknown = set(overrides) - set(TUNABLES)
+        if unknown:
+            raise TypeError(f"Unknown setting(s): {', '.join(sorted(unknown))}")
+        values = globals()
+        for name in TUNABLES:
+            setattr(self, name, overrides.get(name, values[name]))
+
+    @property
+    def INPUT_SIZE(self):
+        # Raycasts + 2 Velocity + 2 Fluid Force + 2 Nearest Food Vector + 1 Energy Level
+        return self.RAY_COUNT + 7
+
+    def replace(self, **overrides):
+        return Settings(**dict(self.as_dict(), **overrides))
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in TUNABLES}
+
+    def __eq__(self, other):
+        return isinstance(other, Settings) and self.as_dict() == other.as_dict()
+
+    def __repr__(self):
+        changed = {name: value for name, value in self.as_dict().items() if value != globals()[name]}
+        return 'Settings(' + ', '.join(f'{name}={value!r}' for name, value in changed.items()) + ')'
+
+
+def parse_settings(specs, base=None):
+    # Settings from 'NAME=VALUE' strings (e.g. runner --set) applied to
+    # `base` (default: Settings()), each value parsed as the type of the
+    # module default it replaces
+    overrides = {}
+    for spec in specs:
+        name, sep, value = spec.partition('=')
+        name = name.strip().upper()
+        if not sep or name not in TUNABLES:
+            raise ValueError(f"Expected NAME=VALUE with NAME one of {', '.join(TUNABLES)}, got {spec!r}")
+        overrides[name] = type(globals()[name])(value.strip())
+    return base.replace(**overrides) if base is not None else Settings(**overrides)
@@ -0,0 +1,229 @@
+
+"""Multi-episode evaluation with common random numbers.
+
+A single episode scores a genome on one random start, food layout and set
+of obstacles, so selection partly rewards luck. Here every genome of a
+generation plays the same K seeded worlds and its fitness is aggregated
+over them (mean, min or a quantile).
+
+Episode k's world is exactly the isolated world ``parallel.evaluate_world``
+builds from seed k for a single genome: same obstacles, food layout, start
+position and sequence of food respawns. EpisodeBatch runs all
+(genome, episode) pairs as rows of one PopulationState, so every step is a
+single vectorized pass over genomes x episodes through the same sensor,
+inference and physics kernels as Simulation.update. Rows never interact:
+each sees only its own world's obstacles and eats from its own copy of the
+world's food.
+"""
+
+import numpy as np
+import config
+import sensors
+from fitcache import weights_key
+from flow import make_flow_field
+from genome import GenomeStack
+from physics import Physics
+from population import PopulationState, fitness_scores
+from simulation import Simulation
+
+AGGREGATES = ('mean', 'min', 'quantile')
+
+
+def episode_seeds(seed, generation, count):
+    # The K world seeds shared by every genome of a generation
+    return [int(np.random.SeedSequence([seed, generation, k]).generate_state(1)[0]) for k in range(count)]
+
+
+def aggregate_fitness(fitness, how=config.EPISODE_AGGREGATE, quantile=config.EPISODE_QUANTILE):
+    # (episodes, genomes) scores -> one score per genome
+    if how == 'mean':
+        return fitness.mean(axis=0)
+    if how == 'min':
+        return fitness.min(axis=0)
+    if how == 'quantile':
+        return np.quantile(fitness, quantile, axis=0)
+    raise ValueError(f"Unknown fitness aggregate: {how!r} (choose from {', '.join(AGGREGATES)})")
+
+
+class EpisodeBatch:
+    """Every genome in ``weights`` (N rows) played in every world in ``seeds``.
+
+    Row ``k * N + i`` of ``state`` is genome ``i`` in episode ``k``.
+    """
+
+    def __init__(self, weights, seeds, flow_field=None, physics=None, food_count=None, obstacle_count=None,
+                 settings=None):
+        self.settings = settings = settings if settings is not None else config
+        food_count = settings.FOOD_COUNT if food_count is None else food_count
+        obstacle_count = settings.OBSTACLE_COUNT if obstacle_count is None else obstacle_count
+        weights = np.asarray(weights, dtype=float)
+        self.genome_count = n = len(weights)
+        self.episode_count = k = len(seeds)
+        self.flow_field = flow_field if flow_field is not None else make_flow_field(settings=settings)
+        self.physics = physics if physics is not None else Physics(settings=settings)
+        self.ray_angles = sensors.ray_offsets(settings.RAY_COUNT, settings.RAY_SPREAD)
+
+        # Build each world the way a one-genome Simulation would, then keep
+        # its RNG to draw that world's food respawns from
+        worlds = [Simulation(genomes=GenomeStack(weights[:1], settings), verbose=False, seed=seed,
+                             flow_field=self.flow_field, food_count=food_count, obstacle_count=obstacle_count,
+                             settings=settings) for seed in seeds]
+        self.rngs = [world.rng for world in worlds]
+        self.target_pos = worlds[0].target_pos
+        self.food_extent = worlds[0].food_extent
+        self.world = np.repeat(np.arange(k), n)
+
+        self.obstacle_pos = np.stack([world.obstacle_pos for world in worlds]).reshape(k, obstacle_count, 2)
+        self.obstacle_vel = np.stack([world.obstacle_vel for world in worlds]).reshape(k, obstacle_count, 2)
+        self.obstacle_radius = np.stack([world.obstacle_radius for world in worlds]).reshape(k, obstacle_count)
+        self.food_pos = np.repeat(np.stack([world.food_pos for world in worlds]).reshape(k, food_count, 2), n, axis=0)
+        self.food_energy = np.repeat(np.stack([world.food_energy for world in worlds]).reshape(k, food_count), n, axis=0)
+        # Respawn r of any row in world w lands at respawn_pos[w, r]
+        self.respawn_pos = np.zeros((k, 0, 2))
+        self.respawns = np.zeros(n * k, dtype=int)
+
+        start_pos = np.repeat(np.stack([world.state.pos[0] for world in worlds]), n, axis=0)
+        self.state = PopulationState(GenomeStack(np.tile(weights, (k, 1)), settings), start_pos, settings=settings)
+
+    def update_obstacles(self):
+        # Simulation.update_obstacles for all worlds at once
+        w, h = self.settings.SCREEN_WIDTH/2, self.settings.SCREEN_HEIGHT/2
+        pos, vel, radius = self.obstacle_pos, self.obstacle_vel, self.obstacle_radius
+        pos += vel
+        vel[(pos[..., 0] < -w + radius) | (pos[..., 0] > w - radius), 0] *= -1
+        vel[(pos[..., 1] < -h + radius) | (pos[..., 1] > h - radius), 1] *= -1
+
+    def update(self):
+        # Same sequence as Simulation.update, over rows in separate worlds
+        self.update_obstacles()
+        state = self.state
+        active = state.drain_energy()
+        if len(active) == 0:
+            return 0
+
+        world = self.world[active]
+        obstacle_pos = self.obstacle_pos[world]
+        obstacle_radius = self.obstacle_radius[world]
+        pos = state.pos[active]
+        fluid_force = self.flow_field.sample(pos)
+
+        angles = state.angle[active, None] + self.ray_angles
+        sight_range = self.settings.SIGHT_RANGE
+        sight = sensors.cast_rays(pos, angles, obstacle_pos, obstacle_radius, sight_range)
+        state.sensor_readings[active] = sensors.readings(sight, sight_range)
+
+        inputs = state.brain_inputs(active, fluid_force, self.food_vectors(active, pos))
+        outputs = state.genomes.feed_forward(inputs, active)
+        state.act(active, outputs)
+        self.physics.step(state, active, self.flow_field, obstacle_pos, obstacle_radius, None, fluid_force)
+
+        # Bots that crashed this step still get to eat, as before
+        self.eat_food(active)
+        return len(state.compact())
+
+    def _food_distances(self, active, pos):
+        delta = self.food_pos[active] - pos[:, None, :]
+        return delta, np.hypot(delta[..., 0], delta[..., 1])
+
+    def food_vectors(self, active, pos):
+        # Unit vector to each row's nearest food item (see population.food_vectors)
+        vec = np.zeros((len(active), 2))
+        if self.food_pos.shape[1] == 0:
+            return vec
+        delta, dist = self._food_distances(active, pos)
+        nearest = dist.argmin(axis=1)
+        rows = np.arange(len(active))
+        d = dist[rows, nearest]
+        ok = d > 0
+        vec[ok] = delta[rows[ok], nearest[ok]] / d[ok, None]
+        return vec
+
+    def eat_food(self, active):
+        _, dist = self._food_distances(active, self.state.pos[active])
+        # Row-major order: each row eats its items in id order, like the
+        # per-world eat_food; Bot radius ~5 + Food radius ~10
+        rows, items = np.nonzero(dist < 15)
+        if len(rows) == 0:
+            return
+        bots = active[rows]
+        np.add.at(self.state.energy, bots, self.food_energy[bots, items])
+        np.add.at(self.state.food_eaten, bots, 1)
+
+        # Each eaten item respawns at the row's next draw from its world
+        rank = np.arange(len(rows)) - np.searchsorted(rows, rows)
+        draw = self.respawns[bots] + rank
+        np.add.at(self.respawns, bots, 1)
+        self._reserve_respawns(int(draw.max()) + 1)
+        self.food_pos[bots, items] = self.respawn_pos[self.world[bots], draw]
+        self.food_energy[bots, items] = self.settings.FOOD_ENERGY_VALUE
+
+    def _reserve_respawns(self, count):
+        # Extend every world's respawn sequence to at least `count` positions.
+        # A block of draws equals that many Simulation.create_one_food calls
+        have = self.respawn_pos.shape[1]
+        if count <= have:
+            return
+        extra = max(count, 2 * have) - have
+        fx, fy = self.food_extent
+        more = np.stack([rng.uniform([-fx, -fy], [fx, fy], (extra, 2)) for rng in self.rngs])
+        self.respawn_pos = np.concatenate([self.respawn_pos, more], axis=1)
+
+    def run(self, steps=None):
+        # Until time runs out or every row is dead; returns the steps taken
+        if steps is None:
+            steps = self.settings.SIMULATION_STEPS
+        for step in range(steps):
+            if self.update() == 0:
+                return step + 1
+        return steps
+
+    def results(self):
+        # (fitness, food_eaten, alive), each shaped (episodes, genomes)
+        state = self.state
+        dist = np.hypot(state.pos[:, 0] - self.target_pos[0], state.pos[:, 1] - self.target_pos[1])
+        fitness = fitness_scores(state.crashed, state.alive, state.food_eaten, dist)
+        shape = (self.episode_count, self.genome_count)
+        return fitness.reshape(shape), state.food_eaten.reshape(shape), state.alive.reshape(shape)
+
+
+def evaluate_episodes(weights, seeds, steps=None, aggregate=config.EPISODE_AGGREGATE,
+                      quantile=config.EPISODE_QUANTILE, flow_field=None, settings=None, cache=None):
+    # Per-genome (fitness, food_eaten, alive) for Simulation.load_results:
+    # aggregated fitness, food eaten over all episodes, alive in every one.
+    # cache: optional fitcache.FitnessCache, keyed like
+    # parallel.Evaluator.evaluate_episodes; only genomes missing from it run
+    if cache is not None:
+        return _evaluate_cached(weights, seeds, steps, aggregate, quantile, flow_field, settings, cache)
+    batch = EpisodeBatch(weights, seeds, flow_field, settings=settings)
+    batch.run(steps)
+    fitness, food_eaten, alive = batch.results()
+    return aggregate_fitness(fitness, aggregate, quantile), food_eaten.sum(axis=0), alive.all(axis=0)
+
+
+def _evaluate_cached(weights, seeds, steps, aggregate, quantile, flow_field, settings, cache):
+    # Rows never interact, so a genome's results don't depend on which other
+    # genomes share its batch. Identical genomes are simulated once
+    episode_key = (tuple(int(seed) for seed in seeds), aggregate, quantile)
+    results = [None] * len(weights)
+    pending = {}
+    for i in range(len(weights)):
+        key = weights_key(weights[i:i + 1], episode_key)
+        if key in pending:
+            pending[key].append(i)
+            continue
+        cached = cache.get(key)
+        if cached is not None:
+            results[i] = cached
+        else:
+            pending[key] = [i]
+    if pending:
+        rows = [pending[key][0] for key in pending]
+        fitness, food_eaten, alive = evaluate_episodes(weights[rows], seeds, steps, aggregate, quantile,
+                                                       flow_field, settings)
+        for r, key in enumerate(pending):
+            result = (fitness[r:r + 1], food_eaten[r:r + 1], alive[r:r + 1])
+            cache.put(key, result)
+            for i in pending[key]:
+                results[i] = result
+    fitness, food_eaten, alive = (np.concatenate(column) for column in zip(*results))
+    return fitness, food_eaten, alive
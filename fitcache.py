@@ -0,0 +1,57 @@
+
+"""Fitness cache for deterministic evaluations.
+
+In an isolated world (parallel.Evaluator) a genome's results depend only on
+its weights and the world seed, so identical (genome, seed) pairs - elites
+carried over unchanged, children that no mutation touched, a converged
+population full of copies - need simulating only once. Keys are a content
+hash of the world's weight rows plus the seed; the cache holds a bounded
+number of entries and evicts the least recently used.
+"""
+
+import hashlib
+from collections import OrderedDict
+import numpy as np
+import config
+
+
+def weights_key(weights, seed):
+    # Content hash of a world's weight rows (float64, C order) plus its seed
+    digest = hashlib.blake2b(np.ascontiguousarray(weights, dtype=float).tobytes(), digest_size=16).digest()
+    return digest, seed
+
+
+class FitnessCache:
+    def __init__(self, maxsize=config.FITNESS_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        # Cached value or None; counts a hit or a miss
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'cache_hits': self.hits,
+            'cache_misses': self.misses,
+            'cache_hit_rate': self.hits / lookups if lookups else 0.0,
+            'cache_size': len(self.entries),
+        }
@@ -0,0 +1,115 @@
+
+"""Flow fields shared by the physics and the renderer.
+
+Every field offers ``force(x, y)`` for a single point and ``sample(pos)`` for
+an (N, 2) batch of positions, written into ``out`` if given.
+"""
+
+import math
+import numpy as np
+import config
+from world import arena_size
+
+
+class AnalyticFlowField:
+    # Chaotic Flow Field: Sine/Cosine based on position
+    # Flow(x,y) = (cos(y/scale), sin(x/scale)) * strength
+    def __init__(self, scale=None, strength=None, drift=0.2, settings=None):
+        settings = settings if settings is not None else config
+        self.scale = settings.FLUID_SCALE if scale is None else scale
+        self.strength = settings.FLUID_STRENGTH if strength is None else strength
+        # Constant drift to the right so bots don't just get stuck in loops forever
+        self.drift = drift
+
+    def force(self, x, y):
+        fx = math.cos(y / self.scale) * self.strength + self.drift
+        fy = math.sin(x / self.scale) * self.strength
+        return (fx, fy)
+
+    def sample(self, pos, out=None):
+        # Computed in place in `out`, so a given buffer means no allocation
+        forces = np.empty_like(pos, dtype=float) if out is None else out
+        fx, fy = forces[:, 0], forces[:, 1]
+        np.divide(pos[:, 1], self.scale, out=fx)
+        np.cos(fx, out=fx)
+        fx *= self.strength
+        fx += self.drift
+        np.divide(pos[:, 0], self.scale, out=fy)
+        np.sin(fy, out=fy)
+        fy *= self.strength
+        return forces
+
+
+class GridFlowField:
+    """A flow field sampled once onto a regular grid.
+
+    ``values`` is (ny, nx, 2) with node (iy, ix) at
+    ``origin + (ix, iy) * spacing``. Lookups are bilinear and clamp to the
+    grid edge, so any field (analytic, CFD output, a stored vortex) costs
+    the same per step once it is on the grid.
+    """
+
+    def __init__(self, values, origin, spacing):
+        self.values = np.asarray(values, dtype=float)
+        self.origin = np.asarray(origin, dtype=float)
+        self.spacing = float(spacing)
+
+    @classmethod
+    def from_field(cls, field, spacing=None, bounds=None, settings=None):
+        # Sample `field` over bounds (x0, y0, x1, y1), by default the arena
+        settings = settings if settings is not None else config
+        spacing = settings.FLOW_GRID_SPACING if spacing is None else spacing
+        if bounds is None:
+            width, height = arena_size(settings)
+            w, h = width/2, height/2
+            bounds = (-w, -h, w, h)
+        x0, y0, x1, y1 = bounds
+        xs = x0 + np.arange(int(math.ceil((x1 - x0) / spacing)) + 1) * spacing
+        ys = y0 + np.arange(int(math.ceil((y1 - y0) / spacing)) + 1) * spacing
+        gx, gy = np.meshgrid(xs, ys)
+        nodes = np.stack([gx.ravel(), gy.ravel()], axis=1)
+        values = field.sample(nodes).reshape(len(ys), len(xs), 2)
+        return cls(values, (x0, y0), spacing)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data['values'], data['origin'], data['spacing'])
+
+    def save(self, path):
+        np.savez(path, values=self.values, origin=self.origin, spacing=self.spacing)
+
+    def force(self, x, y):
+        fx, fy = self.sample(np.array([[x, y]], dtype=float))[0]
+        return (float(fx), float(fy))
+
+    def sample(self, pos, out=None):
+        ny, nx = self.values.shape[:2]
+        g = (np.asarray(pos, dtype=float) - self.origin) / self.spacing
+        ix = np.clip(np.floor(g[:, 0]).astype(int), 0, max(nx - 2, 0))
+        iy = np.clip(np.floor(g[:, 1]).astype(int), 0, max(ny - 2, 0))
+        tx = np.clip(g[:, 0] - ix, 0, 1)[:, None]
+        ty = np.clip(g[:, 1] - iy, 0, 1)[:, None]
+        ix1 = np.minimum(ix + 1, nx - 1)
+        iy1 = np.minimum(iy + 1, ny - 1)
+        v = self.values
+        forces = ((v[iy, ix] * (1 - tx) + v[iy, ix1] * tx) * (1 - ty) +
+                  (v[iy1, ix] * (1 - tx) + v[iy1, ix1] * tx) * ty)
+        if out is None:
+            return forces
+        out[:] = forces
+        return out
+
+
+def make_flow_field(mode=None, path=None, settings=None):
+    # 'analytic' evaluates the formula every lookup; 'grid' samples it once.
+    # A path to a saved GridFlowField (.npz) overrides both.
+    settings = settings if settings is not None else config
+    mode = settings.FLOW_FIELD if mode is None else mode
+    if path:
+        return GridFlowField.load(path)
+    if mode == 'grid':
+        return GridFlowField.from_field(AnalyticFlowField(settings=settings), settings=settings)
+    if mode == 'analytic':
+        return AnalyticFlowField(settings=settings)
+    raise ValueError(f"Unknown flow field mode: {mode!r}")
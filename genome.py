@@ -1,74 +1,187 @@
-
-import random
-import math
-import config
-
-class Genome:
-    def __init__(self):
-        # Weights for Input -> Hidden layer
-        self.w_ih = [[random.uniform(-1, 1) for _ in range(config.HIDDEN_SIZE)] for _ in range(config.INPUT_SIZE)]
-        # Weights for Hidden -> Output layer
-        self.w_ho = [[random.uniform(-1, 1) for _ in range(config.OUTPUT_SIZE)] for _ in range(config.HIDDEN_SIZE)]
-        
-        # Biases
-        self.b_h = [random.uniform(-1, 1) for _ in range(config.HIDDEN_SIZE)]
-        self.b_o = [random.uniform(-1, 1) for _ in range(config.OUTPUT_SIZE)]
-
-    def feed_forward(self, inputs):
-        # Input -> Hidden
-        hidden = []
-        for j in range(config.HIDDEN_SIZE):
-            s = 0
-            for i in range(config.INPUT_SIZE):
-                s += inputs[i] * self.w_ih[i][j]
-            s += self.b_h[j]
-            hidden.append(math.tanh(s))
-        
-        # Hidden -> Output
-        outputs = []
-        for k in range(config.OUTPUT_SIZE):
-            s = 0
-            for j in range(config.HIDDEN_SIZE):
-                s += hidden[j] * self.w_ho[j][k]
-            s += self.b_o[k]
-            outputs.append(math.tanh(s))
-        
-        return outputs
-
-    def crossover(self, partner):
-        child = Genome()
-        # Randomly mix weights from self and partner
-        for i in range(config.INPUT_SIZE):
-            for j in range(config.HIDDEN_SIZE):
-                child.w_ih[i][j] = self.w_ih[i][j] if random.random() > 0.5 else partner.w_ih[i][j]
-        
-        for j in range(config.HIDDEN_SIZE):
-            for k in range(config.OUTPUT_SIZE):
-                child.w_ho[j][k] = self.w_ho[j][k] if random.random() > 0.5 else partner.w_ho[j][k]
-        
-        # Mix biases
-        child.b_h = [self.b_h[i] if random.random() > 0.5 else partner.b_h[i] for i in range(config.HIDDEN_SIZE)]
-        child.b_o = [self.b_o[i] if random.random() > 0.5 else partner.b_o[i] for i in range(config.OUTPUT_SIZE)]
-        
-        return child
-
-    def mutate(self):
-        # Mutate Input->Hidden weights
-        for i in range(config.INPUT_SIZE):
-            for j in range(config.HIDDEN_SIZE):
-                if random.random() < config.MUTATION_RATE:
-                    self.w_ih[i][j] += random.gauss(0, config.MUTATION_AMOUNT)
-        
-        # Mutate Hidden->Output weights
-        for j in range(config.HIDDEN_SIZE):
-            for k in range(config.OUTPUT_SIZE):
-                if random.random() < config.MUTATION_RATE:
-                    self.w_ho[j][k] += random.gauss(0, config.MUTATION_AMOUNT)
-
-        # Mutate Biases
-        for i in range(config.HIDDEN_SIZE):
-             if random.random() < config.MUTATION_RATE:
-                 self.b_h[i] += random.gauss(0, config.MUTATION_AMOUNT)
-        for i in range(config.OUTPUT_SIZE):
-             if random.random() < config.MUTATION_RATE:
-                 self.b_o[i] += random.gauss(0, config.MUTATION_AMOUNT)
+import numpy as np
+import config
+
+
+class Layout:
+    """Network shape and where each part sits in the flat weight vector:
+    w_ih | w_ho | b_h | b_o."""
+
+    __slots__ = ('inputs', 'hidden', 'outputs', 'w_ho', 'b_h', 'b_o', 'size')
+
+    def __init__(self, inputs, hidden, outputs):
+        self.inputs = inputs
+        self.hidden = hidden
+        self.outputs = outputs
+        self.w_ho = inputs * hidden
+        self.b_h = self.w_ho + hidden * outputs
+        self.b_o = self.b_h + hidden
+        self.size = self.b_o + outputs
+
+    @property
+    def shape(self):
+        return (self.inputs, self.hidden, self.outputs)
+
+    def __eq__(self, other):
+        return isinstance(other, Layout) and self.shape == other.shape
+
+    def __hash__(self):
+        return hash(self.shape)
+
+    def __reduce__(self):
+        return Layout, self.shape
+
+
+def layout(settings=None):
+    # Layout for a config.Settings (default: the config module itself)
+    source = settings if settings is not None else config
+    return Layout(source.INPUT_SIZE, source.HIDDEN_SIZE, source.OUTPUT_SIZE)
+
+
+# Layout of the default configuration
+DEFAULT_LAYOUT = layout()
+W_IH_SIZE = DEFAULT_LAYOUT.w_ho
+W_HO_SIZE = DEFAULT_LAYOUT.b_h - DEFAULT_LAYOUT.w_ho
+GENOME_SIZE = DEFAULT_LAYOUT.size
+
+# Default generator for callers that don't pass their own
+default_rng = np.random.default_rng()
+
+
+class Genome:
+    """Network weights stored in one flat float64 buffer.
+
+    ``w_ih``, ``w_ho``, ``b_h`` and ``b_o`` are views into ``weights``, which
+    may itself be a row of a whole generation's weight matrix. The network
+    shape comes from ``settings`` (a config.Settings; default: config).
+    """
+
+    __slots__ = ('weights', 'layout', 'w_ih', 'w_ho', 'b_h', 'b_o')
+
+    def __init__(self, weights=None, rng=None, settings=None):
+        if weights is None:
+            weights = random_weights(1, rng, settings)[0]
+        self._bind(weights, layout(settings))
+
+    @classmethod
+    def view(cls, weights, shape):
+        # Genome over an existing buffer with a known Layout
+        genome = cls.__new__(cls)
+        genome._bind(weights, shape)
+        return genome
+
+    def _bind(self, weights, shape):
+        if len(weights) != shape.size:
+            raise ValueError(f"{len(weights)} weights don't fit a {shape.shape} network ({shape.size} weights)")
+        self.weights = weights
+        self.layout = shape
+        # Weights for Input -> Hidden layer
+        self.w_ih = weights[:shape.w_ho].reshape(shape.inputs, shape.hidden)
+        # Weights for Hidden -> Output layer
+        self.w_ho = weights[shape.w_ho:shape.b_h].reshape(shape.hidden, shape.outputs)
+
+        # Biases
+        self.b_h = weights[shape.b_h:shape.b_o]
+        self.b_o = weights[shape.b_o:]
+
+    def __getstate__(self):
+        # Only the flat buffer (and its shape) needs to cross a pickle boundary
+        return self.weights.copy(), self.layout
+
+    def __setstate__(self, state):
+        self._bind(*state)
+
+    def feed_forward(self, inputs):
+        # Input -> Hidden
+        hidden = np.tanh(np.dot(inputs, self.w_ih) + self.b_h)
+        # Hidden -> Output
+        return np.tanh(np.dot(hidden, self.w_ho) + self.b_o)
+
+    def crossover(self, partner, rng=None):
+        # Randomly mix weights from self and partner
+        rng = rng if rng is not None else default_rng
+        mask = rng.random(self.layout.size) > 0.5
+        return Genome.view(np.where(mask, self.weights, partner.weights), self.layout)
+
+    def mutate(self, rng=None, settings=None):
+        mutate_weights(self.weights, rng, settings)
+
+
+def random_weights(count, rng=None, settings=None):
+    # A fresh (count, genome size) generation of weights in [-1, 1)
+    rng = rng if rng is not None else default_rng
+    return rng.uniform(-1, 1, (count, layout(settings).size))
+
+
+def crossover_weights(parents_a, parents_b, rng=None):
+    # Uniform crossover of two (N, genome size) parent matrices in one draw
+    rng = rng if rng is not None else default_rng
+    mask = rng.random(parents_a.shape) > 0.5
+    return np.where(mask, parents_a, parents_b)
+
+
+def mutate_weights(weights, rng=None, settings=None):
+    # In-place Gaussian mutation of a flat genome or a whole weight matrix
+    rng = rng if rng is not None else default_rng
+    source = settings if settings is not None else config
+    mask = rng.random(weights.shape) < source.MUTATION_RATE
+    weights[mask] += rng.normal(0, source.MUTATION_AMOUNT, np.count_nonzero(mask))
+
+
+class GenomeStack:
+    """A whole generation's genomes as one (N, genome size) weight matrix.
+
+    ``w_ih`` is (N, INPUT, HIDDEN), ``w_ho`` is (N, HIDDEN, OUTPUT), ``b_h``
+    and ``b_o`` are (N, HIDDEN) and (N, OUTPUT); all are views into
+    ``weights``, so inference over the whole stack needs no copy. For a
+    subset (the living bots) ``feed_forward`` gathers those layers once and
+    reuses them until the subset changes; write rows through
+    ``stack[i] = genome`` so the gathered copy is dropped. Indexing returns
+    a ``Genome`` viewing one row.
+    """
+
+    def __init__(self, weights, settings=None):
+        self.weights = weights
+        self.layout = shape = layout(settings)
+        n = len(weights)
+        if weights.shape[1:] != (shape.size,):
+            raise ValueError(f"Weights of shape {weights.shape} don't fit a {shape.shape} network")
+        self.w_ih = weights[:, :shape.w_ho].reshape(n, shape.inputs, shape.hidden)
+        self.w_ho = weights[:, shape.w_ho:shape.b_h].reshape(n, shape.hidden, shape.outputs)
+        self.b_h = weights[:, shape.b_h:shape.b_o]
+        self.b_o = weights[:, shape.b_o:]
+        self._forget()
+
+    @classmethod
+    def from_genomes(cls, genomes, settings=None):
+        size = layout(settings).size
+        return cls(np.array([g.weights for g in genomes], dtype=float).reshape(-1, size), settings)
+
+    def __len__(self):
+        return len(self.weights)
+
+    def __getitem__(self, i):
+        return Genome.view(self.weights[i], self.layout)
+
+    def __setitem__(self, i, genome):
+        self.weights[i] = genome.weights
+        self._forget()
+
+    def feed_forward(self, inputs, idx):
+        # Batched Genome.feed_forward: row k of inputs is fed through genome idx[k]
+        w_ih, w_ho, b_h, b_o = self._layers(idx)
+        hidden = np.tanh(np.einsum('ni,nih->nh', inputs, w_ih) + b_h)
+        return np.tanh(np.einsum('nh,nho->no', hidden, w_ho) + b_o)
+
+    def _layers(self, idx):
+        # The layers of genomes idx. A step's idx is the active set, which
+        # only changes when bots die, so the gather runs once per change
+        # rather than once per step
+        if not np.array_equal(idx, self._rows):
+            self._rows = np.array(idx)
+            self._gathered = self.w_ih[idx], self.w_ho[idx], self.b_h[idx], self.b_o[idx]
+        return self._gathered
+
+    def _forget(self):
+        # Back to the whole stack in order, which is the views themselves
+        self._rows = np.arange(len(self.weights))
+        self._gathered = self.w_ih, self.w_ho, self.b_h, self.b_o
@@ -0,0 +1,211 @@
+
+"""Island-model evolution across worker processes.
+
+Each island is a full Simulation (its own world, RNG and population) driven
+through the usual run_generation/evolve cycle in a process of its own.
+Every ``interval`` generations each island sends copies of its ``migrants``
+best genomes to one other island, and the arrivals replace the last
+children of the receiver's next generation (elites are never displaced).
+
+Migrants travel as flat float64 weight buffers through a transport that
+only moves bytes to an island id, so the queue transport below can be
+swapped for a socket one to spread islands over several machines. Islands
+share no mutable state. Every island blocks until its own immigrants have
+arrived, so a seeded run gives the same result however the processes are
+scheduled.
+"""
+
+import multiprocessing
+import queue
+import struct
+import time
+import traceback
+import numpy as np
+import config
+from profiling import Profiler
+from simulation import Simulation
+
+TOPOLOGIES = ('ring', 'random')
+
+# Source island, generation, number of migrants; float64 weights follow
+_HEADER = struct.Struct('<iiI')
+
+
+def encode_migrants(source, generation, weights):
+    weights = np.ascontiguousarray(weights, dtype='<f8')
+    return _HEADER.pack(source, generation, len(weights)) + weights.tobytes()
+
+
+def decode_migrants(data):
+    source, generation, count = _HEADER.unpack_from(data)
+    weights = np.frombuffer(data, dtype='<f8', offset=_HEADER.size).reshape(count, -1)
+    return source, generation, weights
+
+
+def island_seed(seed, island):
+    # Independent but reproducible seed for every island
+    return int(np.random.SeedSequence([seed, island]).generate_state(1)[0])
+
+
+def migration_targets(topology, count, seed, generation):
+    # targets[i] is the island that island i sends to. Both topologies are
+    # a single cycle through all islands, so every island also receives
+    # exactly one batch
+    if topology == 'ring':
+        return [(i + 1) % count for i in range(count)]
+    if topology == 'random':
+        # A fresh cycle per migration, drawn identically by every island
+        order = np.random.default_rng([seed, generation]).permutation(count)
+        targets = [0] * count
+        for k, i in enumerate(order):
+            targets[i] = int(order[(k + 1) % count])
+        return targets
+    raise ValueError(f"Unknown migration topology: {topology!r} (choose from {', '.join(TOPOLOGIES)})")
+
+
+class QueueTransport:
+    # One inbox queue per island; must be created before the islands start
+    def __init__(self, count, context=None):
+        context = context or multiprocessing.get_context()
+        self.inboxes = [context.Queue() for _ in range(count)]
+
+    def send(self, island, data):
+        self.inboxes[island].put(data)
+
+    def recv(self, island):
+        return self.inboxes[island].get()
+
+
+def _receive(transport, island, generation, pending):
+    # Immigrants for this generation's migration. A batch for a later one
+    # can arrive first (its sender ran ahead), so it waits in `pending`
+    while generation not in pending:
+        _, sent, weights = decode_migrants(transport.recv(island))
+        pending[sent] = weights
+    return pending.pop(generation)
+
+
+def island_main(island, count, seed, transport, results, generations, population_size, steps,
+                topology, interval, migrants, stop_rules=None, settings=None, profile=False):
+    # Runs in the island's own process; reports back through `results`.
+    # profile=True adds the generation's phase timings to its stats
+    try:
+        profiler = Profiler(enabled=profile)
+        sim = Simulation(population_size=population_size, verbose=False, seed=island_seed(seed, island),
+                         stop_rules=stop_rules, settings=settings, profiler=profiler)
+        migrating = count > 1 and migrants > 0
+        pending = {}
+        best_fitness, best_weights = -np.inf, None
+
+        for i in range(generations):
+            generation = sim.generation
+            start = time.perf_counter()
+            steps_run = sim.run_generation(steps)
+            elapsed = time.perf_counter() - start
+            sim.calculate_fitness()
+
+            migration = migrating and (generation + 1) % interval == 0
+            if migration:
+                top = np.argsort(-sim.state.fitness, kind='stable')[:migrants]
+                emigrants = sim.state.genomes.weights[top]
+            with profiler.phase('evolve'):
+                stats = sim.evolve(evaluated=True)
+            timings = profiler.end_generation(generation)
+            if stats['best_fitness'] > best_fitness:
+                best_fitness, best_weights = stats['best_fitness'], sim.best_genome.weights.copy()
+            # The epoch's elite, which run_islands compares across islands
+            if (generation + 1) % interval == 0 or i == generations - 1:
+                elite = (generation, stats['best_fitness'], sim.best_genome.weights.copy())
+                results.put(('elite', island, elite))
+
+            if migration:
+                target = migration_targets(topology, count, seed, generation)[island]
+                transport.send(target, encode_migrants(island, generation, emigrants))
+                arrivals = _receive(transport, island, generation, pending)
+                # Replace the last children; elites come first and stay
+                weights = sim.state.genomes.weights
+                room = len(weights) - min(sim.settings.ELITISM_COUNT, len(weights))
+                arrivals = arrivals[:room]
+                weights[len(weights) - len(arrivals):] = arrivals
+
+            stats['island'] = island
+            stats['steps'] = steps_run
+            stats['steps_per_sec'] = steps_run / elapsed if elapsed > 0 else 0.0
+            stats['bot_steps_per_sec'] = stats['steps_per_sec'] * sim.population_size
+            stats['migrated'] = migration
+            if profile:
+                stats['phases'] = timings['phases']
+            results.put(('stats', island, stats))
+        results.put(('done', island, (best_fitness, best_weights)))
+    except BaseException:
+        results.put(('error', island, traceback.format_exc()))
+
+
+def run_islands(count, generations, population_size=None, steps=None,
+                seed=0, topology=config.MIGRATION_TOPOLOGY, interval=config.MIGRATION_INTERVAL,
+                migrants=config.MIGRANT_COUNT, stop_rules=None, on_stats=None, settings=None,
+                on_elite=None, profile=False):
+    # Evolve `count` islands for `generations` generations each.
+    # on_stats(stats) sees every island's per-generation stats as they come
+    # in (stats['island'] says which; with profile=True they carry
+    # 'phases' timings). on_elite(weights, fitness, generation) sees the
+    # best genome over all islands once every island has finished a
+    # migration epoch (every `interval` generations, and the last one).
+    # Returns (best_fitness, best_weights) over all islands and
+    # generations. Every island runs with `settings` (default: the current
+    # config)
+    settings = settings if settings is not None else config.Settings()
+    if topology not in TOPOLOGIES:
+        raise ValueError(f"Unknown migration topology: {topology!r} (choose from {', '.join(TOPOLOGIES)})")
+    context = multiprocessing.get_context()
+    transport = QueueTransport(count, context)
+    results = context.Queue()
+    processes = [context.Process(target=island_main, daemon=True,
+                                 args=(i, count, seed, transport, results, generations, population_size,
+                                       steps, topology, max(1, interval), migrants, stop_rules, settings,
+                                       profile))
+                 for i in range(count)]
+    for process in processes:
+        process.start()
+
+    best_fitness, best_weights = -np.inf, None
+    # generation -> the best (fitness, weights) reported for it so far, and
+    # by how many islands
+    epochs = {}
+    done = 0
+    try:
+        while done < count:
+            try:
+                kind, island, payload = results.get(timeout=1.0)
+            except queue.Empty:
+                # A killed island never reports, and its neighbours would
+                # wait for its migrants forever
+                for i, process in enumerate(processes):
+                    if process.exitcode not in (None, 0):
+                        raise RuntimeError(f"Island {i} exited with code {process.exitcode}")
+                continue
+            if kind == 'error':
+                raise RuntimeError(f"Island {island} failed:\n{payload}")
+            if kind == 'stats':
+                if on_stats:
+                    on_stats(payload)
+            elif kind == 'elite':
+                generation, fitness, weights = payload
+                best, reported = epochs.get(generation, ((-np.inf, None), 0))
+                if fitness > best[0]:
+                    best = (fitness, weights)
+                epochs[generation] = (best, reported + 1)
+                if reported + 1 == count:
+                    del epochs[generation]
+                    if on_elite:
+                        on_elite(best[1], best[0], generation)
+            else:
+                done += 1
+                if payload[0] > best_fitness:
+                    best_fitness, best_weights = payload
+    finally:
+        for process in processes:
+            if done < count:
+                process.terminate()
+            process.join()
+    return best_fitness, best_weights
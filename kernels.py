@@ -0,0 +1,326 @@
+
+"""Optional fused step kernel, compiled with numba.
+
+The default ('numpy') engine runs a step as a sequence of vectorized
+passes: energy, flow, sensing, nearest food, inference, thrust, physics.
+Every pass allocates its own temporaries. With ``BACKEND = 'numba'`` the
+Simulation instead runs all of those passes in one kernel, a loop over the
+living bots (in parallel with ``prange``) that touches each bot's state
+once and writes it back in place. Only the obstacle motion before the
+kernel and the eating after it stay in NumPy.
+
+numba is optional. Without it the 'numba' backend can't be selected, but
+the kernel still runs as plain (slow) Python when built with
+``compiled=False``, so its logic can be checked anywhere:
+
+    python -m kernels --steps 300 --pop 50           # compiled kernel
+    python -m kernels --interpreted                  # without numba
+
+``conformance`` runs the same seeded world with the reference ``Bot.update``
+loop, the NumPy engine and the fused kernel, and reports the first step
+where a backend's trajectories leave the reference's.
+"""
+
+import argparse
+import math
+import sys
+import numpy as np
+import config
+from flow import AnalyticFlowField, GridFlowField
+from genome import layout
+from sensors import ray_offsets
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+BACKENDS = ('numpy', 'numba')
+
+if numba is not None:
+    _jit = numba.njit(cache=True)
+    prange = numba.prange
+else:
+    def _jit(func):
+        return func
+    prange = range
+
+
+@_jit
+def _flow(x, y, kind, scale, strength, drift, values, x0, y0, spacing):
+    # One AnalyticFlowField.sample (kind 0) or GridFlowField.sample (kind 1)
+    if kind == 0:
+        return math.cos(y / scale) * strength + drift, math.sin(x / scale) * strength
+    ny, nx = values.shape[0], values.shape[1]
+    gx = (x - x0) / spacing
+    gy = (y - y0) / spacing
+    ix = min(max(math.floor(gx), 0), max(nx - 2, 0))
+    iy = min(max(math.floor(gy), 0), max(ny - 2, 0))
+    tx = min(max(gx - ix, 0.0), 1.0)
+    ty = min(max(gy - iy, 0.0), 1.0)
+    ix1 = min(ix + 1, nx - 1)
+    iy1 = min(iy + 1, ny - 1)
+    fx = ((values[iy, ix, 0] * (1 - tx) + values[iy, ix1, 0] * tx) * (1 - ty) +
+          (values[iy1, ix, 0] * (1 - tx) + values[iy1, ix1, 0] * tx) * ty)
+    fy = ((values[iy, ix, 1] * (1 - tx) + values[iy, ix1, 1] * tx) * (1 - ty) +
+          (values[iy1, ix, 1] * (1 - tx) + values[iy1, ix1, 1] * tx) * ty)
+    return fx, fy
+
+
+@_jit
+def _collides(x, y, w, h, obstacle_pos, obstacle_radius):
+    # Physics.collide for one bot
+    if x < -w or x > w or y < -h or y > h:
+        return True
+    for k in range(len(obstacle_radius)):
+        if math.hypot(x - obstacle_pos[k, 0], y - obstacle_pos[k, 1]) < obstacle_radius[k] + 5:
+            return True
+    return False
+
+
+def _step(active, pos, vel, acc, angle, energy, alive, crashed, sensor_readings, weights, scratch,
+          n_in, n_hidden, n_out, rays, obstacle_pos, obstacle_radius, food_pos,
+          kind, scale, strength, drift, values, x0, y0, spacing,
+          consumption, starting_energy, drag, thrust_power, thrust_cost, max_speed, sight_range,
+          dt, substeps, verlet, w, h):
+    # One Simulation.update (after the obstacles move, before eating) for
+    # every bot in `active`. scratch[k] holds bot k's inputs and hidden layer
+    n_rays = len(rays)
+    b_h = n_in * n_hidden + n_hidden * n_out
+    b_o = b_h + n_hidden
+    for k in prange(len(active)):
+        i = active[k]
+        # Energy
+        energy[i] -= consumption
+        if energy[i] <= 0:
+            alive[i] = False
+            continue
+        x, y = pos[i, 0], pos[i, 1]
+        vx, vy = vel[i, 0], vel[i, 1]
+        ffx, ffy = _flow(x, y, kind, scale, strength, drift, values, x0, y0, spacing)
+
+        # Sense
+        inputs = scratch[k]
+        for r in range(n_rays):
+            rx = math.cos(angle[i] + rays[r])
+            ry = math.sin(angle[i] + rays[r])
+            best = sight_range
+            for o in range(len(obstacle_radius)):
+                ox = obstacle_pos[o, 0] - x
+                oy = obstacle_pos[o, 1] - y
+                projection = ox * rx + oy * ry
+                dist_to_ray = math.hypot(rx * projection - ox, ry * projection - oy)
+                radius = obstacle_radius[o]
+                if projection > 0 and dist_to_ray < radius:
+                    entry = projection - math.sqrt(max(radius * radius - dist_to_ray * dist_to_ray, 0.0))
+                    best = min(best, entry)
+            sensor_readings[i, r] = 1.0 - max(0.0, best) / sight_range
+            inputs[r] = sensor_readings[i, r]
+
+        # Nearest food
+        nearest = -1
+        shortest = math.inf
+        for j in range(len(food_pos)):
+            d = math.hypot(food_pos[j, 0] - x, food_pos[j, 1] - y)
+            if d < shortest:
+                shortest = d
+                nearest = j
+        food_x = food_y = 0.0
+        if nearest >= 0 and shortest > 0:
+            food_x = (food_pos[nearest, 0] - x) / shortest
+            food_y = (food_pos[nearest, 1] - y) / shortest
+
+        # Think
+        inputs[n_rays] = math.tanh(vx * 0.1)
+        inputs[n_rays + 1] = math.tanh(vy * 0.1)
+        inputs[n_rays + 2] = math.tanh(ffx * 0.1)
+        inputs[n_rays + 3] = math.tanh(ffy * 0.1)
+        inputs[n_rays + 4] = food_x
+        inputs[n_rays + 5] = food_y
+        inputs[n_rays + 6] = energy[i] / starting_energy
+        genome = weights[i]
+        for j in range(n_hidden):
+            total = genome[b_h + j]
+            for m in range(n_in):
+                total += inputs[m] * genome[m * n_hidden + j]
+            inputs[n_in + j] = math.tanh(total)
+        steer_total = genome[b_o]
+        thrust_total = genome[b_o + 1]
+        for j in range(n_hidden):
+            steer_total += inputs[n_in + j] * genome[n_in * n_hidden + j * n_out]
+            thrust_total += inputs[n_in + j] * genome[n_in * n_hidden + j * n_out + 1]
+        outputs = (math.tanh(steer_total), math.tanh(thrust_total))
+
+        # Act
+        thrust = max(0.0, outputs[1]) * thrust_power
+        energy[i] -= thrust * thrust_cost
+        angle[i] += outputs[0] * 0.2
+        thrust_x = acc[i, 0] + math.cos(angle[i]) * thrust
+        thrust_y = acc[i, 1] + math.sin(angle[i]) * thrust
+
+        # Integrate + collide, as Physics.step
+        dh = dt / substeps
+        hit = False
+        for substep in range(substeps):
+            if substep > 0:
+                ffx, ffy = _flow(x, y, kind, scale, strength, drift, values, x0, y0, spacing)
+            speed = math.hypot(vx, vy) * drag
+            ax = ffx - speed * vx + thrust_x
+            ay = ffy - speed * vy + thrust_y
+            if verlet:
+                x += vx * dh + 0.5 * ax * (dh * dh)
+                y += vy * dh + 0.5 * ay * (dh * dh)
+                nvx = vx + ax * dh
+                nvy = vy + ay * dh
+                nfx, nfy = _flow(x, y, kind, scale, strength, drift, values, x0, y0, spacing)
+                speed = math.hypot(nvx, nvy) * drag
+                ax += nfx - speed * nvx + thrust_x
+                ay += nfy - speed * nvy + thrust_y
+                vx += 0.5 * ax * dh
+                vy += 0.5 * ay * dh
+            else:
+                vx += ax * dh
+                vy += ay * dh
+            scale_v = max_speed / max(math.hypot(vx, vy), max_speed)
+            vx *= scale_v
+            vy *= scale_v
+            if not verlet:
+                x += vx * dh
+                y += vy * dh
+            if _collides(x, y, w, h, obstacle_pos, obstacle_radius):
+                hit = True
+                break
+
+        pos[i, 0], pos[i, 1] = x, y
+        vel[i, 0], vel[i, 1] = vx, vy
+        acc[i, 0] = acc[i, 1] = 0.0
+        if hit:
+            crashed[i] = True
+            alive[i] = False
+
+
+_step_jit = numba.njit(parallel=True, cache=True)(_step) if numba is not None else None
+
+
+class FusedStep:
+    """The fused kernel bound to a Simulation's settings.
+
+    ``step(sim, active)`` advances the living bots in ``active`` exactly as
+    the NumPy engine's energy..physics passes do and returns the bots that
+    still get to eat this step (the survivors plus those that crashed).
+    ``compiled=False`` runs the same kernel as plain Python.
+    """
+
+    def __init__(self, settings=None, compiled=True):
+        if compiled and numba is None:
+            raise RuntimeError("The 'numba' backend needs numba (pip install numba)")
+        self.settings = settings = settings if settings is not None else config
+        self.kernel = _step_jit if compiled else _step
+        self.layout = layout(settings)
+        self.rays = np.asarray(ray_offsets(settings.RAY_COUNT, settings.RAY_SPREAD), dtype=float)
+        self.scratch = np.empty((0, self.layout.inputs + self.layout.hidden))
+
+    def _flow_args(self, flow_field):
+        if isinstance(flow_field, AnalyticFlowField):
+            return (0, float(flow_field.scale), float(flow_field.strength), float(flow_field.drift),
+                    np.zeros((1, 1, 2)), 0.0, 0.0, 1.0)
+        if isinstance(flow_field, GridFlowField):
+            x0, y0 = flow_field.origin
+            return (1, 1.0, 0.0, 0.0, flow_field.values, float(x0), float(y0), flow_field.spacing)
+        raise ValueError(f"The fused kernel can't sample a {type(flow_field).__name__}; "
+                         "use an AnalyticFlowField or GridFlowField")
+
+    def step(self, sim, active):
+        state, settings, physics = sim.state, self.settings, sim.physics
+        if len(self.scratch) < len(active):
+            self.scratch = np.empty((len(active), self.scratch.shape[1]))
+        shape = self.layout
+        self.kernel(active, state.pos, state.vel, state.acc, state.angle, state.energy, state.alive,
+                    state.crashed, state.sensor_readings, state.genomes.weights, self.scratch,
+                    shape.inputs, shape.hidden, shape.outputs, self.rays,
+                    sim.obstacle_pos, sim.obstacle_radius, sim.food_pos, *self._flow_args(sim.flow_field),
+                    float(settings.ENERGY_CONSUMPTION_RATE), float(settings.STARTING_ENERGY),
+                    float(settings.DRAG_COEFFICIENT), float(settings.THRUST_POWER),
+                    float(settings.THRUST_ENERGY_COST), float(settings.MAX_SPEED), float(settings.SIGHT_RANGE),
+                    physics.dt, physics.substeps, physics.method == 'verlet',
+                    float(physics.bounds[0]), float(physics.bounds[1]))
+        return active[state.alive[active] | state.crashed[active]]
+
+
+def make_step(settings=None):
+    # The FusedStep for settings.BACKEND, or None for the NumPy engine
+    settings = settings if settings is not None else config
+    if settings.BACKEND == 'numpy':
+        return None
+    if settings.BACKEND == 'numba':
+        return FusedStep(settings)
+    raise ValueError(f"Unknown backend: {settings.BACKEND!r} (choose from {', '.join(BACKENDS)})")
+
+
+def _reference_update(sim):
+    # One step of the original per-bot loop: Bot.update for every living
+    # bot, then the same batched eating as the engines
+    sim.update_obstacles()
+    state = sim.state
+    active = state.compact()
+    for i in active:
+        bot = sim.population[i]
+        bot.update(sim.get_flow_force(*bot.pos), sim.obstacles, sim.foods)
+    sim.eat_food(active[state.alive[active] | state.crashed[active]])
+    state.compact()
+
+
+def conformance(seed=0, population_size=50, steps=300, compiled=True, settings=None):
+    """Run one seeded world with each backend against the Bot.update loop.
+
+    Returns {backend: first step whose positions, velocities, energy or
+    alive/crashed flags differ from the reference (None if none do)}.
+    The classic (screen-sized) world only, as Bot.update collides with the
+    screen's walls.
+    """
+    from simulation import Simulation
+    settings = (settings if settings is not None else config.Settings()).replace(BACKEND='numpy')
+
+    def simulation():
+        return Simulation(population_size=population_size, verbose=False, seed=seed, settings=settings)
+
+    reference = simulation()
+    engines = {'numpy': simulation(), 'numba': simulation()}
+    engines['numba'].kernel = FusedStep(settings, compiled)
+    first = {name: None for name in engines}
+    for step in range(steps):
+        _reference_update(reference)
+        expected = reference.state
+        for name, sim in engines.items():
+            sim.update()
+            state = sim.state
+            same = (np.allclose(state.pos, expected.pos) and np.allclose(state.vel, expected.vel)
+                    and np.allclose(state.energy, expected.energy)
+                    and np.array_equal(state.alive, expected.alive)
+                    and np.array_equal(state.crashed, expected.crashed))
+            if not same and first[name] is None:
+                first[name] = step
+        if not expected.alive.any():
+            break
+    return first
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='kernels', description='Check the step backends against Bot.update.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--pop', type=int, default=50)
+    parser.add_argument('--steps', type=int, default=300)
+    parser.add_argument('--interpreted', action='store_true', help='run the fused kernel without numba')
+    args = parser.parse_args(argv)
+    if not args.interpreted and numba is None:
+        raise SystemExit("numba is not installed; use --interpreted to check the kernel's logic")
+
+    first = conformance(args.seed, args.pop, args.steps, compiled=not args.interpreted)
+    for name, step in first.items():
+        print(f"{name}: " + ("matches Bot.update" if step is None else f"differs from Bot.update at step {step}"))
+    if any(step is not None for step in first.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,144 +1,145 @@
-
-import turtle
-import random
-import math
-import threading
-import queue
-import logging
-
-# Set up logging
-logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
-
-# Set up the window
-window = turtle.Screen()
-window.title("Fluid Dynamics Bot Simulation")
-window.bgcolor("white")
-
-# Set up the turtle
-bot_turtle = turtle.Turtle()
-bot_turtle.penup()
-
-# Set up the genetic algorithm parameters
-population_size = 10
-mutation_rate = 0.1
-
-# Set up the neural network parameters
-num_inputs = 4  # Updated to include sight and hearing inputs
-num_hidden = 20
-num_outputs = 2
-
-# Define the fluid dynamics simulation
-def simulate_fluid_dynamics(bot_shape, bot_position, obstacles):
-    fluid_force = (0, 0)  # Placeholder, you can implement the actual fluid forces here
-
-    # Sight ability
-    closest_obstacle_distance = float('inf')
-    for obstacle in obstacles:
-        distance = math.dist(bot_position, obstacle)
-        if distance < closest_obstacle_distance:
-            closest_obstacle_distance = distance
-
-    # Hearing ability
-    sound_intensity = 0
-    for obstacle in obstacles:
-        distance = math.dist(bot_position, obstacle)
-        if distance < 10:  # Assuming sound can be heard within a distance of 10 units
-            sound_intensity += 1 / distance
-
-    return fluid_force, closest_obstacle_distance, sound_intensity
-
-# Define the bot's movement behavior
-def move(bot, obstacles):
-    # Calculate fluid forces, sight, and hearing inputs
-    fluid_force, closest_obstacle_distance, sound_intensity = simulate_fluid_dynamics(bot['shape'], bot['position'], obstacles)
-
-    # Update bot's position and shape based on the fluid forces
-    x_avg = sum([vertex[0] for vertex in bot['shape']]) / len(bot['shape'])
-    y_avg = sum([vertex[1] for vertex in bot['shape']]) / len(bot['shape'])
-    x_avg += fluid_force[0]
-    y_avg += fluid_force[1]
-    bot['shape'] = [(vertex[0] + fluid_force[0], vertex[1] + fluid_force[1]) for vertex in bot['shape']]
-
-    # Calculate inputs for neural network
-    inputs = [x_avg, y_avg, closest_obstacle_distance, sound_intensity]
-
-    # Feed-forward neural network
-    hidden = [sum([inputs[i] * bot['weights_ih'][i][j] for i in range(num_inputs)]) for j in range(num_hidden)]
-    hidden = [math.tanh(value) for value in hidden]
-    outputs = [sum([hidden[i] * bot['weights_ho'][i][j] for i in range(num_hidden)]) for j in range(num_outputs)]
-    outputs = [math.tanh(value) for value in outputs]
-
-    # Choose the action based on the outputs
-    if outputs[0] > 0:
-        bot['shape'][0] = (bot['shape'][0][0] + 0.1, bot['shape'][0][1])
-    if outputs[1] > 0:
-        bot['shape'][1] = (bot['shape'][1][0] - 0.1, bot['shape'][1][1])
-    else:
-        bot['shape'][2] = (bot['shape'][2][0] + 0.1, bot['shape'][2][1])
-
-# Set up the evolution loop
-generations = 100
-
-# Thread function to run a single generation
-def run_generation(gen, output_queue):
-    # Generate initial population
-    population = [{
-        'shape': [(0, -10), (-5, 10), (5, 10)],
-        'weights_ih': [[random.uniform(-1, 1) for _ in range(num_hidden)] for _ in range(num_inputs)],
-        'weights_ho': [[random.uniform(-1, 1) for _ in range(num_outputs)] for _ in range(num_hidden)],
-        'position': (0, -10)  # Initial position of the bot
-    } for _ in range(population_size)]
-
-    # Define obstacles
-    obstacles = [(10, 10), (-10, 10)]  # Example obstacle positions
-
-    # Run simulations for the current generation
-    for bot_num, bot in enumerate(population):
-        logging.info(f"Generation: {gen + 1}, Bot: {bot_num + 1}")
-
-        # Play the game with the current bot's shape
-        bot_shape = bot['shape']
-        for _ in range(100):
-            # Move the bot based on fluid forces, sight, hearing, and neural network output
-            move(bot, obstacles)
-
-    # Select the fittest bot for reproduction
-    population.sort(key=lambda x: sum([vertex[1] for vertex in x['shape']]), reverse=True)
-    fittest_bot = population[0]
-
-    # Add the fittest bot's shape to the output queue
-    output_queue.put((gen, fittest_bot['shape']))
-
-# Create a queue for storing the output of each generation
-output_queue = queue.Queue()
-
-# Create a list to store the threads
-threads = []
-
-# Execute the generations using threading
-for gen in range(generations):
-    thread = threading.Thread(target=run_generation, args=(gen, output_queue))
-    thread.start()
-    threads.append(thread)
-
-# Wait for all threads to finish
-for thread in threads:
-    thread.join()
-
-# Process the output queue to get the fittest bot's shape for each generation
-results = []
-while not output_queue.empty():
-    results.append(output_queue.get())
-
-# Render the final results in the turtle window
-for gen, fittest_shape in results:
-    bot_turtle.clear()
-    for vertex in fittest_shape:
-        bot_turtle.goto(vertex[0], vertex[1])
-        bot_turtle.pendown()
-    bot_turtle.penup()
-    turtle.update()
-    logging.info("Generation: {}, Fittest bot's shape: {}".format(gen + 1, fittest_shape))
-
-# Keep the window open after the simulation finishes
-turtle.done()
+
+import argparse
+import logging
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import numpy as np
+
+# Set up the genetic algorithm parameters
+population_size = 10
+mutation_rate = 0.1
+
+# Set up the neural network parameters
+num_inputs = 4  # Updated to include sight and hearing inputs
+num_hidden = 20
+num_outputs = 2
+
+# Set up the evolution loop
+generations = 100
+steps = 100
+
+start_shape = ((0, -10), (-5, 10), (5, 10))
+start_position = (0, -10)  # Initial position of the bot
+obstacles = ((10, 10), (-10, 10))  # Example obstacle positions
+
+
+# Define the fluid dynamics simulation for a whole population: positions is
+# (bots, 2); returns per-bot fluid force (bots, 2), sight and hearing (bots,)
+def simulate_fluid_dynamics(positions, obstacles):
+    fluid_force = np.zeros_like(positions)  # Placeholder, you can implement the actual fluid forces here
+
+    distance = np.hypot(positions[:, None, 0] - obstacles[None, :, 0], positions[:, None, 1] - obstacles[None, :, 1])
+
+    # Sight ability
+    closest_obstacle_distance = distance.min(axis=1, initial=np.inf)
+
+    # Hearing ability: sound can be heard within a distance of 10 units
+    near = distance < 10
+    sound_intensity = np.divide(1, distance, out=np.zeros_like(distance), where=near).sum(axis=1)
+
+    return fluid_force, closest_obstacle_distance, sound_intensity
+
+
+# Define the bots' movement behavior; shapes (bots, vertices, 2) are updated
+# in place, weights_ih is (bots, inputs, hidden), weights_ho (bots, hidden, outputs)
+def move(shapes, positions, weights_ih, weights_ho, obstacles):
+    # Calculate fluid forces, sight, and hearing inputs
+    fluid_force, closest_obstacle_distance, sound_intensity = simulate_fluid_dynamics(positions, obstacles)
+
+    # Update bots' positions and shapes based on the fluid forces
+    shapes += fluid_force[:, None, :]
+    center = shapes.mean(axis=1)
+
+    # Calculate inputs for neural network
+    inputs = np.column_stack([center, closest_obstacle_distance, sound_intensity])
+
+    # Feed-forward neural network
+    hidden = np.tanh(np.einsum('bi,bih->bh', inputs, weights_ih))
+    outputs = np.tanh(np.einsum('bh,bho->bo', hidden, weights_ho))
+
+    # Choose the action based on the outputs
+    shapes[outputs[:, 0] > 0, 0, 0] += 0.1
+    push = outputs[:, 1] > 0
+    shapes[push, 1, 0] -= 0.1
+    shapes[~push, 2, 0] += 0.1
+
+
+# Run a single generation in a worker process. Every generation draws from
+# its own generator seeded by (seed, gen), so results don't depend on which
+# worker runs it or when
+def run_generation(gen, seed=0):
+    rng = np.random.default_rng([seed, gen])
+
+    # Generate initial population
+    shapes = np.tile(np.array(start_shape, dtype=float), (population_size, 1, 1))
+    weights_ih = rng.uniform(-1, 1, (population_size, num_inputs, num_hidden))
+    weights_ho = rng.uniform(-1, 1, (population_size, num_hidden, num_outputs))
+    positions = np.tile(np.array(start_position, dtype=float), (population_size, 1))
+    obstacle_pos = np.array(obstacles, dtype=float).reshape(-1, 2)
+
+    # Run simulations for the current generation, all bots at once
+    for _ in range(steps):
+        move(shapes, positions, weights_ih, weights_ho, obstacle_pos)
+
+    # Select the fittest bot (first of any ties)
+    fittest = int(np.argmax(shapes[:, :, 1].sum(axis=1)))
+    return gen, [tuple(vertex) for vertex in shapes[fittest].tolist()]
+
+
+# Run every generation on a bounded process pool; results come back in
+# generation order, handed out to the workers in chunks
+def run_generations(count=generations, seed=0, workers=None, chunksize=None):
+    workers = workers or os.cpu_count() or 1
+    chunksize = chunksize or max(1, math.ceil(count / (workers * 4)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(partial(run_generation, seed=seed), range(count), chunksize=chunksize))
+
+
+# Render the results in the turtle window
+def render(results):
+    import turtle
+
+    # Set up the window
+    window = turtle.Screen()
+    window.title("Fluid Dynamics Bot Simulation")
+    window.bgcolor("white")
+
+    # Set up the turtle
+    bot_turtle = turtle.Turtle()
+    bot_turtle.penup()
+
+    for gen, fittest_shape in results:
+        bot_turtle.clear()
+        for vertex in fittest_shape:
+            bot_turtle.goto(vertex[0], vertex[1])
+            bot_turtle.pendown()
+        bot_turtle.penup()
+        turtle.update()
+
+    # Keep the window open after the simulation finishes
+    turtle.done()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Legacy shape-evolution experiment.")
+    parser.add_argument('--generations', type=int, default=generations)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--chunksize', type=int, default=None, help='generations per task sent to a worker')
+    parser.add_argument('--no-render', action='store_true', help='only log the results')
+    args = parser.parse_args(argv)
+
+    # Set up logging
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+    results = run_generations(args.generations, args.seed, args.workers, args.chunksize)
+    for gen, fittest_shape in results:
+        logging.info("Generation: {}, Fittest bot's shape: {}".format(gen + 1, fittest_shape))
+    if not args.no_render:
+        render(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+
+"""Multiprocess fitness evaluation in isolated worlds.
+
+Every world is rebuilt in the worker from the same seed, so a genome's
+fitness no longer depends on which other bots happened to share its food.
+With ``world_size=1`` each genome gets a world of its own and results are
+independent of the worker count; larger worlds put ``world_size``
+consecutive genomes into one world. Only weight matrices go out to the
+workers and only per-genome scalars (fitness, food eaten, alive) come back.
+Because a world's results depend only on its weights and seed, an optional
+FitnessCache lets identical worlds be simulated once.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import config
+from episodes import evaluate_episodes
+from fitcache import weights_key
+from genome import GenomeStack
+from simulation import Simulation
+
+
+def evaluate_world(weights, seed, steps, stop_rules=None, settings=None):
+    # Simulate one world holding these genomes; runs inside a worker
+    sim = Simulation(genomes=GenomeStack(weights, settings), verbose=False, seed=seed, stop_rules=stop_rules,
+                     settings=settings)
+    sim.run_generation(steps)
+    sim.calculate_fitness()
+    state = sim.state
+    return state.fitness.copy(), state.food_eaten.copy(), state.alive.copy()
+
+
+def evaluate_worlds(worlds, seed, steps, stop_rules=None, settings=None):
+    # One pool task: a contiguous batch of worlds, to amortise IPC
+    return [evaluate_world(weights, seed, steps, stop_rules, settings) for weights in worlds]
+
+
+def evaluate_episode_rows(rows, seeds, steps, aggregate, quantile, settings=None):
+    # One pool task: single-genome rows, batched over genomes x episodes
+    fitness, food_eaten, alive = evaluate_episodes(np.concatenate(rows), seeds, steps, aggregate, quantile,
+                                                   settings=settings)
+    return [(fitness[i:i + 1], food_eaten[i:i + 1], alive[i:i + 1]) for i in range(len(rows))]
+
+
+def world_seed(seed, generation):
+    # Independent but reproducible world seed for every generation
+    return int(np.random.SeedSequence([seed, generation]).generate_state(1)[0])
+
+
+class Evaluator:
+    def __init__(self, workers=None, world_size=1, steps=None, stop_rules=None, cache=None, settings=None):
+        # cache: optional fitcache.FitnessCache, only valid for one steps /
+        # stop_rules / settings combination (none of them is part of its keys).
+        # settings (a config.Settings; default: the current config) is
+        # pickled along with every task
+        self.workers = workers or os.cpu_count() or 1
+        self.world_size = max(1, world_size)
+        self.settings = settings if settings is not None else config.Settings()
+        self.steps = steps if steps is not None else self.settings.SIMULATION_STEPS
+        self.stop_rules = stop_rules
+        self.cache = cache
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+
+    def evaluate(self, weights, seed):
+        # Returns (fitness, food_eaten, alive) arrays, one entry per genome row
+        worlds = [weights[i:i + self.world_size] for i in range(0, len(weights), self.world_size)]
+        keys = [weights_key(world, seed) for world in worlds]
+        # A few tasks per worker keeps the pool busy without tiny messages
+        return self._run(worlds, keys, 4, evaluate_worlds, seed, self.steps, self.stop_rules, self.settings)
+
+    def evaluate_episodes(self, weights, seeds, aggregate=config.EPISODE_AGGREGATE,
+                          quantile=config.EPISODE_QUANTILE):
+        # Like evaluate, but every genome plays all the episode worlds in
+        # `seeds` (see episodes.py); one batched task per worker
+        rows = [weights[i:i + 1] for i in range(len(weights))]
+        episode_key = (tuple(int(seed) for seed in seeds), aggregate, quantile)
+        keys = [weights_key(row, episode_key) for row in rows]
+        return self._run(rows, keys, 1, evaluate_episode_rows, seeds, self.steps, aggregate, quantile,
+                         self.settings)
+
+    def _run(self, units, keys, tasks_per_worker, fn, *args):
+        # fn(list of units, *args) -> one result per unit, run on the pool.
+        # Identical units are simulated once; cached ones not at all
+        results = [None] * len(units)
+        pending = {}
+        for u, key in enumerate(keys):
+            if key in pending:
+                pending[key].append(u)
+                continue
+            cached = self.cache.get(key) if self.cache is not None else None
+            if cached is not None:
+                results[u] = cached
+            else:
+                pending[key] = [u]
+        keys = list(pending)
+        todo = [units[pending[key][0]] for key in keys]
+
+        per_task = max(1, -(-len(todo) // (self.workers * tasks_per_worker)))
+        tasks = [todo[i:i + per_task] for i in range(0, len(todo), per_task)]
+        futures = [self.pool.submit(fn, task, *args) for task in tasks]
+
+        done = [unit for future in futures for unit in future.result()]
+        for key, result in zip(keys, done):
+            for u in pending[key]:
+                results[u] = result
+            if self.cache is not None:
+                self.cache.put(key, result)
+
+        fitness, food_eaten, alive = (np.concatenate(column) for column in zip(*results))
+        return fitness, food_eaten, alive
+
+    def close(self):
+        self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
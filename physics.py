@@ -0,0 +1,169 @@
+
+import numpy as np
+import config
+from world import arena_size
+
+
+class Physics:
+    """Fixed-step integrator and collision resolver for a PopulationState.
+
+    ``step`` advances the bots in ``idx`` by ``dt`` in ``substeps`` equal
+    substeps. Thrust (accumulated in ``state.acc`` once per step) is held
+    constant while fluid force and drag are re-evaluated every substep.
+    'euler' is semi-implicit Euler (velocity, speed limit, then position),
+    which with dt=1 and one substep is exactly the original per-bot update;
+    'verlet' is velocity Verlet, using a predicted velocity for the drag at
+    the end of the substep.
+
+    Wall and obstacle collisions are resolved for the whole batch after each
+    substep; a bot that crashes is frozen for the rest of the step. Working
+    arrays are allocated once for the largest batch seen and reused, and
+    every product goes through them, so with an AnalyticFlowField and fewer
+    than OBSTACLE_GRID_MIN shared obstacles a step allocates nothing per
+    bot. GridFlowField lookups and spatial-grid collision queries still
+    build their own index arrays.
+    Unset arguments come from ``settings`` (a config.Settings; default:
+    config); ``bounds`` is the arena's (half width, half height), by
+    default that of world.arena_size.
+    """
+
+    METHODS = ('euler', 'verlet')
+
+    def __init__(self, dt=None, substeps=None, method=None, settings=None, bounds=None):
+        self.settings = settings = settings if settings is not None else config
+        if bounds is None:
+            width, height = arena_size(settings)
+            bounds = (width/2, height/2)
+        self.bounds = bounds
+        dt = settings.PHYSICS_DT if dt is None else dt
+        substeps = settings.PHYSICS_SUBSTEPS if substeps is None else substeps
+        method = settings.INTEGRATOR if method is None else method
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown integrator: {method!r} (choose from {', '.join(self.METHODS)})")
+        self.dt = float(dt)
+        self.substeps = max(1, int(substeps))
+        self.method = method
+        self.capacity = 0
+
+    def _reserve(self, n):
+        if n > self.capacity:
+            self.capacity = n
+            self._pos = np.empty((n, 2))
+            self._vel = np.empty((n, 2))
+            self._thrust = np.empty((n, 2))
+            self._acc = np.empty((n, 2))
+            self._acc_next = np.empty((n, 2))
+            self._vel_next = np.empty((n, 2))
+            self._tmp = np.empty((n, 2))
+            self._tmp_next = np.empty((n, 2))
+            self._speed = np.empty(n)
+            self._h = np.empty(n)
+            self._h2 = np.empty(n)
+            self._dist = np.empty(n)
+            self._dy = np.empty(n)
+            self._hit = np.empty(n, dtype=bool)
+            self._near = np.empty(n, dtype=bool)
+            self._crashed = np.empty(n, dtype=bool)
+
+    def forces(self, pos, vel, thrust, flow_field, out, speed, tmp, fluid_force=None):
+        # Local fluid force + quadratic drag (-c|v| * v) + thrust, into out
+        if fluid_force is None:
+            flow_field.sample(pos, out=out)
+        else:
+            out[:] = fluid_force
+        np.hypot(vel[:, 0], vel[:, 1], out=speed)
+        speed *= self.settings.DRAG_COEFFICIENT
+        np.multiply(vel, speed[:, None], out=tmp)
+        out -= tmp
+        out += thrust
+        return out
+
+    def limit_speed(self, vel, speed):
+        np.hypot(vel[:, 0], vel[:, 1], out=speed)
+        max_speed = self.settings.MAX_SPEED
+        np.maximum(speed, max_speed, out=speed)
+        np.divide(max_speed, speed, out=speed)
+        vel *= speed[:, None]
+
+    def collide(self, pos, obstacle_pos, obstacle_radius, obstacle_grid, out):
+        # True where a bot is outside the arena or overlapping an obstacle
+        n = len(pos)
+        self._reserve(n)
+        dist, dy, near = self._dist[:n], self._dy[:n], self._near[:n]
+        w, h = self.bounds
+        np.less(pos[:, 0], -w, out=out)
+        out |= np.greater(pos[:, 0], w, out=near)
+        out |= np.less(pos[:, 1], -h, out=near)
+        out |= np.greater(pos[:, 1], h, out=near)
+
+        # Bot radius ~5. Obstacles are shared, or (n, K) per bot when each
+        # bot lives in a world of its own (episodes.EpisodeBatch); few
+        # obstacles are tested one at a time through the reserved buffers
+        per_bot = np.ndim(obstacle_radius) == 2
+        if per_bot or len(obstacle_radius) < self.settings.OBSTACLE_GRID_MIN:
+            for k in range(np.shape(obstacle_radius)[-1]):
+                centre = obstacle_pos[:, k] if per_bot else obstacle_pos[k]
+                radius = obstacle_radius[:, k] if per_bot else obstacle_radius[k]
+                np.subtract(pos[:, 0], centre[..., 0], out=dist)
+                np.subtract(pos[:, 1], centre[..., 1], out=dy)
+                np.hypot(dist, dy, out=dist)
+                out |= np.less(dist, np.add(radius, 5, out=dy), out=near)
+        else:
+            rows, _ = obstacle_grid.query_radius_many(pos, 5)
+            out[rows] = True
+        return out
+
+    def step(self, state, idx, flow_field, obstacle_pos, obstacle_radius, obstacle_grid, fluid_force=None):
+        # fluid_force: the field already sampled at state.pos[idx], if known
+        n = len(idx)
+        self._reserve(n)
+        pos, vel, thrust = self._pos[:n], self._vel[:n], self._thrust[:n]
+        acc, acc_next, vel_next = self._acc[:n], self._acc_next[:n], self._vel_next[:n]
+        tmp, tmp_next = self._tmp[:n], self._tmp_next[:n]
+        speed, h, h2, hit = self._speed[:n], self._h[:n], self._h2[:n], self._hit[:n]
+        crashed = self._crashed[:n]
+
+        # mode='clip' (idx is always in range) lets take write straight into
+        # out instead of through a temporary copy
+        np.take(state.pos, idx, axis=0, out=pos, mode='clip')
+        np.take(state.vel, idx, axis=0, out=vel, mode='clip')
+        np.take(state.acc, idx, axis=0, out=thrust, mode='clip')
+        # Per-bot substep length; set to 0 once a bot has crashed
+        h.fill(self.dt / self.substeps)
+        crashed.fill(False)
+
+        # Products go through tmp/tmp_next; scaling by 0.5 is exact, so the
+        # order of the factors doesn't change the result
+        for substep in range(self.substeps):
+            self.forces(pos, vel, thrust, flow_field, acc, speed, tmp, fluid_force if substep == 0 else None)
+            if self.method == 'euler':
+                vel += np.multiply(acc, h[:, None], out=tmp)
+                self.limit_speed(vel, speed)
+                pos += np.multiply(vel, h[:, None], out=tmp)
+            else:
+                # pos += v*h + a*h^2/2
+                np.multiply(h, h, out=h2)
+                np.multiply(acc, h2[:, None], out=tmp)
+                tmp *= 0.5
+                tmp += np.multiply(vel, h[:, None], out=tmp_next)
+                pos += tmp
+                np.add(vel, np.multiply(acc, h[:, None], out=tmp), out=vel_next)
+                self.forces(pos, vel_next, thrust, flow_field, acc_next, speed, tmp)
+                acc += acc_next
+                np.multiply(acc, h[:, None], out=tmp)
+                tmp *= 0.5
+                vel += tmp
+                self.limit_speed(vel, speed)
+
+            self.collide(pos, obstacle_pos, obstacle_radius, obstacle_grid, hit)
+            crashed |= hit
+            np.putmask(h, crashed, 0.0)
+
+        state.pos[idx] = pos
+        state.vel[idx] = vel
+        # Reset acceleration
+        state.acc[idx] = 0.0
+
+        dead = idx[crashed]
+        state.crashed[dead] = True
+        state.alive[dead] = False
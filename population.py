@@ -0,0 +1,108 @@
+
+import numpy as np
+import config
+
+
+class PopulationState:
+    """Structure-of-arrays state for a whole population of bots.
+
+    Row ``i`` of every array belongs to bot ``i``. The per-step update (and
+    ``physics.Physics``) runs once over an index array of bots instead of
+    once per ``Bot`` object; ``Bot`` instances are thin views onto a single
+    row. ``acc`` accumulates each step's thrust. Constants come from
+    ``settings`` (a config.Settings; default: config).
+    """
+
+    def __init__(self, genomes, start_pos, ray_count=None, settings=None):
+        # genomes is the generation's GenomeStack; its stacked weights serve
+        # batched inference and are only rebuilt when a generation is spawned
+        self.settings = settings if settings is not None else config
+        ray_count = self.settings.RAY_COUNT if ray_count is None else ray_count
+        self.size = n = len(genomes)
+
+        self.pos = np.empty((n, 2))
+        self.vel = np.empty((n, 2))
+        self.acc = np.empty((n, 2))
+        self.angle = np.empty(n)  # Radians
+        self.fitness = np.empty(n)
+        self.energy = np.empty(n)
+        self.alive = np.empty(n, dtype=bool)
+        self.crashed = np.empty(n, dtype=bool)
+        # Fractional when FOOD_CONFLICT = 'split' shares an item
+        self.food_eaten = np.empty(n)
+        self.sensor_readings = np.empty((n, ray_count))
+        self.reset(genomes, start_pos)
+
+    def reset(self, genomes, start_pos):
+        # Start a new generation of the same size in the existing arrays
+        if len(genomes) != self.size:
+            raise ValueError(f"{len(genomes)} genomes for a population of {self.size}")
+        self.genomes = genomes
+        self.pos[:] = np.reshape(start_pos, (self.size, 2))
+        self.vel.fill(0.0)
+        self.acc.fill(0.0)
+        self.angle.fill(0.0)
+        self.fitness.fill(0.0)
+        self.energy.fill(self.settings.STARTING_ENERGY)
+        self.alive.fill(True)
+        self.crashed.fill(False)
+        self.food_eaten.fill(0)
+        self.sensor_readings.fill(0.0)
+
+        # Dense index of living bots. It is compacted whenever bots die, so
+        # every per-step pass only ever touches the living
+        self.active = np.arange(self.size)
+
+    def compact(self):
+        # Drop bots that died since the last compaction from the active set
+        self.active = self.active[self.alive[self.active]]
+        return self.active
+
+    def drain_energy(self):
+        # Metabolic cost for every living bot; returns the survivors
+        idx = self.compact()
+        self.energy[idx] -= self.settings.ENERGY_CONSUMPTION_RATE
+        self.alive[idx[self.energy[idx] <= 0]] = False
+        return self.compact()
+
+    def act(self, idx, outputs):
+        steering = outputs[:, 0] * 0.2  # Max turn rate
+        thrust = np.maximum(0, outputs[:, 1]) * self.settings.THRUST_POWER
+
+        # Energy Cost for Thrust
+        self.energy[idx] -= thrust * self.settings.THRUST_ENERGY_COST
+
+        angle = self.angle[idx] + steering
+        self.angle[idx] = angle
+        self.acc[idx, 0] += np.cos(angle) * thrust
+        self.acc[idx, 1] += np.sin(angle) * thrust
+
+    def brain_inputs(self, idx, fluid_force, food_vec):
+        # Same layout as Bot.update:
+        # sensors, velocity, local fluid force, nearest food vector, energy
+        vel = self.vel[idx]
+        return np.concatenate([
+            self.sensor_readings[idx],
+            np.tanh(vel * 0.1),
+            np.tanh(fluid_force * 0.1),
+            food_vec,
+            (self.energy[idx] / self.settings.STARTING_ENERGY)[:, None],
+        ], axis=1)
+
+
+def food_vectors(pos, food_pos, nearest):
+    # Unit vector from each position to food item nearest[k] ([0, 0] if there
+    # is no food, nearest[k] == -1, or the bot sits exactly on it)
+    vec = np.zeros((len(pos), 2))
+    ok = nearest >= 0
+    delta = food_pos[nearest[ok]] - pos[ok]
+    d = np.hypot(delta[:, 0], delta[:, 1])
+    rows = np.flatnonzero(ok)[d > 0]
+    vec[rows] = delta[d > 0] / d[d > 0, None]
+    return vec
+
+
+def fitness_scores(crashed, alive, food_eaten, dist):
+    # Vectorized Bot.calculate_fitness over arrays of bots
+    score = np.where(alive, 100.0, 0.0) + food_eaten * 50.0 + 1000.0 / (dist + 1.0)
+    return np.where(crashed, 1.0, score)
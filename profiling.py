@@ -0,0 +1,137 @@
+
+"""Low-overhead per-phase instrumentation for the simulation loop.
+
+Hot paths wrap each phase in ``with profiler.phase('sense'):``. While the
+profiler is disabled ``phase`` hands back a shared no-op context manager, so
+the cost is one method call per phase. Enabled, it accumulates wall time
+and call counts per phase, both for the current generation and for the
+whole run, and can also keep every call as a Chrome trace event
+(chrome://tracing, Perfetto).
+"""
+
+import csv
+import json
+import os
+import time
+
+
+class _NullPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler._record(self.name, self.start, time.perf_counter() - self.start)
+        return False
+
+
+class Profiler:
+    def __init__(self, enabled=False, trace=False, log=None):
+        # log: optional ProfileLog receiving one record per generation
+        self.enabled = enabled
+        self.trace = trace
+        self.log = log
+        self.trace_events = []
+        self.totals = {}        # phase -> [seconds, calls] over the whole run
+        self.generation = {}    # phase -> [seconds, calls] this generation
+        self.steps = 0
+        self._phases = {}
+        self._origin = time.perf_counter()
+
+    def phase(self, name):
+        if not self.enabled:
+            return _NULL_PHASE
+        phase = self._phases.get(name)
+        if phase is None:
+            phase = self._phases[name] = _Phase(self, name)
+        return phase
+
+    def _record(self, name, start, elapsed):
+        for table in (self.generation, self.totals):
+            entry = table.get(name)
+            if entry is None:
+                table[name] = [elapsed, 1]
+            else:
+                entry[0] += elapsed
+                entry[1] += 1
+        if self.trace:
+            self.trace_events.append({
+                'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': 0,
+                'ts': (start - self._origin) * 1e6, 'dur': elapsed * 1e6,
+            })
+
+    def end_step(self):
+        if self.enabled:
+            self.steps += 1
+
+    def end_generation(self, generation):
+        # Summarise and reset the per-generation counters; returns the record
+        record = {
+            'generation': generation,
+            'steps': self.steps,
+            'phases': {
+                name: {
+                    'seconds': seconds,
+                    'calls': calls,
+                    'seconds_per_step': seconds / self.steps if self.steps else 0.0,
+                }
+                for name, (seconds, calls) in self.generation.items()
+            },
+        }
+        if self.enabled and self.log:
+            self.log.write(record)
+        if self.enabled and self.trace:
+            self.trace_events.append({
+                'name': f'generation {generation}', 'ph': 'i', 's': 'g', 'pid': os.getpid(), 'tid': 0,
+                'ts': (time.perf_counter() - self._origin) * 1e6,
+            })
+        self.generation = {}
+        self.steps = 0
+        return record
+
+    def write_trace(self, path):
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': self.trace_events, 'displayTimeUnit': 'ms'}, f)
+
+
+class ProfileLog:
+    """Per-generation phase timings as JSON lines (.jsonl) or CSV (.csv)."""
+
+    def __init__(self, path):
+        self.csv = path.endswith('.csv')
+        self.file = open(path, 'w', newline='' if self.csv else None)
+        if self.csv:
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(['generation', 'steps', 'phase', 'seconds', 'calls', 'seconds_per_step'])
+
+    def write(self, record):
+        if self.csv:
+            for name, phase in record['phases'].items():
+                self.writer.writerow([record['generation'], record['steps'], name,
+                                      phase['seconds'], phase['calls'], phase['seconds_per_step']])
+        else:
+            self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
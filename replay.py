@@ -0,0 +1,270 @@
+
+"""Recording and replaying simulation frames.
+
+``ReplayRecorder.record`` is an ``on_step`` callback for
+``Simulation.run_generation`` that captures what the visualizer draws (bot
+positions, headings, energies, the first bot's sensors, obstacles and food)
+as float32 and streams it to a chunked binary file. Recording never touches
+turtle, so it runs at headless speed; the file is watched afterwards with
+the same drawing code:
+
+    python -m runner run --generations 50 --record runs/a.replay --record-every 2
+    python -m replay runs/a.replay --generation 40 --fps 30
+
+File layout (little-endian): a 32-byte header (magic, version, ray count,
+target position), the run's config.Settings as a length-prefixed (u4) JSON
+object, so the viewer draws sight lines, energy bars and walls as the run
+had them, then chunks. Each chunk holds up to ``chunk_frames``
+consecutive recorded steps of one generation: a 24-byte chunk header
+(generation, frames, bots, obstacles, food, payload size) and a
+zlib-compressed payload of the stacked arrays. Readers index the chunk
+headers once and seek straight to the chunks they need.
+"""
+
+import argparse
+import json
+import struct
+import time
+import zlib
+import numpy as np
+import config
+
+MAGIC = b'FLUIDREP'
+VERSION = 2
+_HEADER = struct.Struct('<8sIIff')
+HEADER_SIZE = 32
+_CHUNK = struct.Struct('<IIIIII')
+
+
+class Frame:
+    # One step's worth of drawable state
+    __slots__ = ('generation', 'step', 'bot_pos', 'angle', 'energy', 'alive', 'sensors',
+                 'obstacle_pos', 'obstacle_radius', 'food_pos', 'target_pos')
+
+    def __init__(self, generation, step, bot_pos, angle, energy, alive, sensors,
+                 obstacle_pos, obstacle_radius, food_pos, target_pos):
+        self.generation = generation
+        self.step = step
+        self.bot_pos = bot_pos
+        self.angle = angle
+        self.energy = energy
+        self.alive = alive
+        self.sensors = sensors  # Readings of bot 0, the previous generation's best
+        self.obstacle_pos = obstacle_pos
+        self.obstacle_radius = obstacle_radius
+        self.food_pos = food_pos
+        self.target_pos = target_pos
+
+
+def capture(sim, step):
+    # A Frame viewing the simulation's live arrays (nothing is copied)
+    state = sim.state
+    return Frame(sim.generation, step, state.pos, state.angle, state.energy, state.alive,
+                 state.sensor_readings[0], sim.obstacle_pos, sim.obstacle_radius, sim.food_pos,
+                 sim.target_pos)
+
+
+class ReplayRecorder:
+    def __init__(self, path, every=1, chunk_frames=config.REPLAY_CHUNK_FRAMES):
+        self.file = open(path, 'wb')
+        self.every = max(1, every)
+        self.chunk_frames = max(1, chunk_frames)
+        self.frames = []
+        self.started = False
+
+    def record(self, sim, step):
+        if step % self.every:
+            return
+        if not self.started:
+            self.file.write(_HEADER.pack(MAGIC, VERSION, len(sim.ray_angles), *sim.target_pos).ljust(HEADER_SIZE, b'\0'))
+            settings = config.Settings() if sim.settings is config else sim.settings
+            encoded = json.dumps(settings.as_dict()).encode()
+            self.file.write(struct.pack('<I', len(encoded)) + encoded)
+            self.started = True
+        if self.frames and (self.frames[0].generation != sim.generation or len(self.frames) >= self.chunk_frames):
+            self.flush()
+        state = sim.state
+        self.frames.append(Frame(sim.generation, step, state.pos.astype('<f4'), state.angle.astype('<f4'),
+                                 state.energy.astype('<f4'), state.alive.astype('u1'),
+                                 state.sensor_readings[0].astype('<f4'), sim.obstacle_pos.astype('<f4'),
+                                 sim.obstacle_radius.astype('<f4'), sim.food_pos.astype('<f4'), sim.target_pos))
+
+    def flush(self):
+        frames = self.frames
+        if not frames:
+            return
+        first = frames[0]
+        arrays = [np.array([f.step for f in frames], dtype='<u4')]
+        arrays += [np.stack([getattr(f, name) for f in frames])
+                   for name in ('bot_pos', 'angle', 'energy', 'alive', 'sensors', 'obstacle_pos', 'food_pos')]
+        arrays.append(first.obstacle_radius)
+        payload = zlib.compress(b''.join(a.tobytes() for a in arrays), 1)
+        self.file.write(_CHUNK.pack(first.generation, len(frames), len(first.bot_pos),
+                                    len(first.obstacle_pos), len(first.food_pos), len(payload)))
+        self.file.write(payload)
+        self.file.flush()
+        self.frames = []
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Replay:
+    """Reads a recording; ``chunks`` lists (generation, frames, offset) per chunk.
+
+    ``settings`` is the recorded run's config.Settings (the defaults for a
+    version 1 file, which didn't store them).
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        magic, version, self.ray_count, tx, ty = _HEADER.unpack(self.file.read(HEADER_SIZE)[:_HEADER.size])
+        if magic != MAGIC:
+            raise ValueError(f"Not a replay file: {path}")
+        if version not in (1, VERSION):
+            raise ValueError(f"Unsupported replay version {version}: {path}")
+        self.target_pos = (tx, ty)
+        offset = HEADER_SIZE
+        self.settings = config.Settings()
+        if version >= 2:
+            size, = struct.unpack('<I', self.file.read(4))
+            recorded = json.loads(self.file.read(size))
+            # Settings a newer version added are left at their defaults
+            self.settings = config.Settings(**{name: value for name, value in recorded.items()
+                                               if name in config.TUNABLES})
+            offset += 4 + size
+
+        # Index every chunk header, skipping over the payloads. A chunk cut
+        # short (the recording was interrupted) ends the index
+        self.chunks = []
+        while True:
+            self.file.seek(offset)
+            head = self.file.read(_CHUNK.size)
+            if len(head) < _CHUNK.size:
+                break
+            fields = _CHUNK.unpack(head)
+            end = offset + _CHUNK.size + fields[5]
+            self.file.seek(0, 2)
+            if end > self.file.tell():
+                break
+            self.chunks.append((fields, offset + _CHUNK.size))
+            offset = end
+
+    @property
+    def generations(self):
+        return sorted({fields[0] for fields, _ in self.chunks})
+
+    def _decode(self, fields, offset):
+        generation, count, bots, obstacles, foods, size = fields
+        self.file.seek(offset)
+        data = zlib.decompress(self.file.read(size))
+        shapes = [('<u4', (count,)), ('<f4', (count, bots, 2)), ('<f4', (count, bots)),
+                  ('<f4', (count, bots)), ('u1', (count, bots)), ('<f4', (count, self.ray_count)),
+                  ('<f4', (count, obstacles, 2)), ('<f4', (count, foods, 2)), ('<f4', (obstacles,))]
+        arrays, pos = [], 0
+        for dtype, shape in shapes:
+            a = np.frombuffer(data, dtype=dtype, count=int(np.prod(shape)), offset=pos).reshape(shape)
+            arrays.append(a)
+            pos += a.nbytes
+        steps, bot_pos, angle, energy, alive, sensors, obstacle_pos, food_pos, radius = arrays
+        for k in range(count):
+            yield Frame(generation, int(steps[k]), bot_pos[k], angle[k], energy[k], alive[k].astype(bool),
+                        sensors[k], obstacle_pos[k], radius, food_pos[k], self.target_pos)
+
+    def frames(self, generation=None, every=1):
+        # Frames from `generation` on (default: from the start), keeping every
+        # `every`-th; chunks before `generation` are never read
+        every = max(1, every)
+        n = 0
+        for fields, offset in self.chunks:
+            if generation is not None and fields[0] < generation:
+                continue
+            for frame in self._decode(fields, offset):
+                if n % every == 0:
+                    yield frame
+                n += 1
+
+    def close(self):
+        self.file.close()
+
+
+def view(path, generation=None, every=1, fps=0, flow_field=None, settings=None):
+    # Play a recording in the turtle window; fps=0 plays as fast as it draws.
+    # settings default to the recorded run's. Keys: space pauses, n skips
+    # to the next generation
+    import turtle
+    from flow import make_flow_field
+    from main import Renderer
+
+    replay = Replay(path)
+    settings = settings if settings is not None else replay.settings
+    renderer = Renderer(flow_field if flow_field is not None else make_flow_field(settings=settings),
+                        settings=settings)
+    window = renderer.window
+    controls = {'paused': False, 'skip': False}
+    window.onkey(lambda: controls.update(paused=not controls['paused']), 'space')
+    window.onkey(lambda: controls.update(skip=True), 'n')
+    window.listen()
+
+    try:
+        current = None
+        for frame in replay.frames(generation, every):
+            if controls['skip'] and frame.generation == current:
+                continue
+            controls['skip'] = False
+            if frame.generation != current:
+                current = frame.generation
+                window.title(f"Replay: generation {current}")
+            start = time.perf_counter()
+            renderer.draw_frame(frame)
+            while controls['paused']:
+                window.update()
+                time.sleep(0.05)
+            if fps:
+                time.sleep(max(0.0, 1.0 / fps - (time.perf_counter() - start)))
+        turtle.done()
+    except turtle.Terminator:
+        pass
+    finally:
+        replay.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='replay', description='Watch a recorded run in the turtle visualizer.')
+    parser.add_argument('path')
+    parser.add_argument('--generation', type=int, default=None, help='start at this generation')
+    parser.add_argument('--every', type=int, default=1, help='draw every Nth recorded frame')
+    parser.add_argument('--fps', type=float, default=0, help='frames per second (0 = as fast as possible)')
+    parser.add_argument('--flow', choices=['analytic', 'grid'], default=None,
+                        help="how to draw the background (default: the recorded run's FLOW_FIELD)")
+    parser.add_argument('--flow-file', default=None, help='draw a saved GridFlowField (.npz) as the background')
+    parser.add_argument('--set', nargs='+', action='extend', default=[], metavar='NAME=VALUE',
+                        help="override the recorded run's settings for drawing")
+    parser.add_argument('--list', action='store_true', help='list the recorded generations and exit')
+    args = parser.parse_args(argv)
+
+    replay = Replay(args.path)
+    if args.list:
+        print(' '.join(map(str, replay.generations)))
+        replay.close()
+        return
+    settings = replay.settings
+    replay.close()
+    try:
+        settings = config.parse_settings(args.set, base=settings)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    from flow import make_flow_field
+    view(args.path, args.generation, args.every, args.fps, make_flow_field(args.flow, args.flow_file, settings),
+         settings)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,337 @@
+
+"""Headless batch runner.
+
+Drives Simulation.update/evolve without importing turtle, so evolution runs
+as fast as the engine allows and works on machines without a display:
+
+    python -m runner run --generations 100 --pop 2000 --seed 1 --out runs/a
+
+Per-generation stats are printed and appended to ``<out>/stats.jsonl``; the
+best genome of the last generation is saved as ``<out>/best_genome.npy``.
+``--render-every N`` attaches the turtle visualizer and draws every Nth frame.
+``--workers N`` evaluates genomes in isolated worlds on a process pool instead
+(-1 uses every core). ``--episodes K`` scores every genome on the same K
+seeded worlds, batched (and aggregated by ``--aggregate``). With either,
+``--fitness-cache N`` skips genomes already evaluated in the same world(s).
+``--checkpoint FILE`` saves the run at generation boundaries and ``--resume``
+continues it bit-for-bit.
+``--archive FILE`` appends each generation's top genomes to a genome archive.
+``--record FILE`` saves frames for ``python -m replay`` without rendering.
+``--telemetry PORT`` serves live stats and the elite genome (see telemetry.py).
+``--islands N`` evolves N sub-populations of ``--pop`` bots in separate
+processes with migration between them.
+``--set NAME=VALUE ...`` overrides any config.TUNABLES setting for this run
+(e.g. ``--set HIDDEN_SIZE=16 FLUID_STRENGTH=0.8``); see also sweep.py.
+``--set WORLD_WIDTH=8000 WORLD_HEIGHT=6000`` runs in a large chunked arena
+(see world.py).
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+import numpy as np
+import config
+from archive import GenomeArchive
+from checkpoint import save_checkpoint, load_checkpoint
+from episodes import AGGREGATES, episode_seeds, evaluate_episodes
+from fitcache import FitnessCache
+from flow import make_flow_field
+from profiling import Profiler, ProfileLog
+from stopping import parse_rules
+from simulation import Simulation
+from world import uses_chunks
+
+
+def _chain(callbacks):
+    # One on_step callback calling each of `callbacks` in turn (or None)
+    if len(callbacks) <= 1:
+        return callbacks[0] if callbacks else None
+
+    def on_step(sim, step):
+        for callback in callbacks:
+            callback(sim, step)
+    return on_step
+
+
+def _start_telemetry(args):
+    if not args.telemetry:
+        return None
+    from telemetry import TelemetryServer
+    server = TelemetryServer(args.telemetry_host, args.telemetry).start()
+    print(f"Telemetry on http://{server.host}:{server.port}/ (WebSocket: /ws)")
+    return server
+
+
+def run_island_model(args, stop_rules, seed, settings):
+    from islands import run_islands
+    telemetry = _start_telemetry(args)
+    stats_file = None
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+        stats_file = open(os.path.join(args.out, 'stats.jsonl'), 'w')
+
+    def on_stats(stats):
+        # Phase timings (only measured for telemetry) go to telemetry only,
+        # as in the single-population run
+        phases = stats.pop('phases', None)
+        print(f"Island {stats['island']} gen {stats['generation']}: best={stats['best_fitness']:.1f} "
+              f"mean={stats['mean_fitness']:.1f} food={stats['food_eaten']:g} "
+              f"survivors={stats['survivors']} steps/s={stats['steps_per_sec']:.0f}"
+              + (" (migrated)" if stats['migrated'] else ""))
+        if stats_file:
+            stats_file.write(json.dumps(stats) + '\n')
+            stats_file.flush()
+        if telemetry:
+            telemetry.publish(dict(stats, phases=phases))
+
+    try:
+        best_fitness, best_weights = run_islands(args.islands, args.generations, args.pop, args.steps, seed,
+                                                 args.topology, args.migration_interval, args.migrants,
+                                                 stop_rules, on_stats, settings,
+                                                 on_elite=telemetry.set_elite if telemetry else None,
+                                                 profile=bool(telemetry))
+    finally:
+        if stats_file:
+            stats_file.close()
+        if telemetry:
+            telemetry.close()
+    print(f"Best fitness over all islands: {best_fitness:.1f}")
+    if args.out and best_weights is not None:
+        np.save(os.path.join(args.out, 'best_genome.npy'), best_weights)
+
+
+def _settings(args):
+    # The --set overrides as a config.Settings
+    try:
+        return config.parse_settings(args.set)
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+
+def _defaults(args, settings):
+    # Options left unset fall back to the run's settings
+    if args.generations is None:
+        args.generations = settings.GENERATIONS
+    if args.steps is None:
+        args.steps = settings.SIMULATION_STEPS
+
+
+def run(args):
+    settings = _settings(args)
+    if args.islands > 1:
+        if (args.workers or args.episodes or args.fitness_cache or args.checkpoint or args.render_every
+                or args.profile or args.trace or args.archive or args.record):
+            raise SystemExit("--islands can't be combined with --workers, --episodes, --fitness-cache, "
+                             "--checkpoint, --render-every, --profile, --trace, --archive or --record")
+        seed = args.seed if args.seed is not None else random.randrange(2**32)
+        _defaults(args, settings)
+        return run_island_model(args, parse_rules(args.early_stop), seed, settings)
+    if uses_chunks(settings) and (args.episodes or args.checkpoint or args.record or args.render_every):
+        raise SystemExit("A chunked world (WORLD_WIDTH/WORLD_HEIGHT) can't be combined with --episodes, "
+                         "--checkpoint, --record or --render-every")
+    if (args.workers or args.episodes) and (args.record or args.render_every):
+        raise SystemExit("--record and --render-every need the shared-world simulation "
+                         "(no --workers or --episodes)")
+    if args.fitness_cache and not (args.workers or args.episodes):
+        raise SystemExit("--fitness-cache needs --workers or --episodes; the shared world isn't deterministic "
+                         "per genome")
+    if args.episodes and args.early_stop != ['all_dead']:
+        raise SystemExit("--early-stop can't be combined with --episodes; episode worlds run until every "
+                         "bot is dead or time runs out")
+
+    resuming = args.resume and args.checkpoint and os.path.exists(args.checkpoint)
+    if resuming and args.set:
+        raise SystemExit("--set can't be used with --resume; a resumed run keeps its checkpoint's settings")
+
+    stop_rules = parse_rules(args.early_stop)
+    profile_log = ProfileLog(args.profile) if args.profile else None
+    telemetry = _start_telemetry(args)
+    # Telemetry reports phase timings, so it switches the profiler on too
+    profiler = Profiler(enabled=bool(args.profile or args.trace or telemetry), trace=bool(args.trace),
+                        log=profile_log)
+    if resuming:
+        # Settings (and so the flow field) come from the checkpoint
+        sim, extra = load_checkpoint(args.checkpoint, verbose=False, profiler=profiler, stop_rules=stop_rules)
+        seed = extra['seed']
+        sim.flow_field = make_flow_field(args.flow, args.flow_file, sim.settings)
+        print(f"Resuming from {args.checkpoint} at generation {sim.generation}")
+    else:
+        # Always pick a concrete seed so it can be stored with checkpoints
+        seed = args.seed if args.seed is not None else random.randrange(2**32)
+        sim = Simulation(population_size=args.pop, verbose=False, seed=seed, profiler=profiler,
+                         stop_rules=stop_rules, settings=settings,
+                         flow_field=make_flow_field(args.flow, args.flow_file, settings))
+    settings = sim.settings
+    _defaults(args, settings)
+    run_info = {'seed': seed}
+    if args.archive:
+        # A resumed run keeps appending to its archive. The checkpoint
+        # remembers where the run's records begin, so rewinding past the
+        # checkpoint never touches records other runs put in the same file
+        sim.archive = GenomeArchive(args.archive, top=args.archive_top, settings=settings)
+        run_info['archive_start'] = sim.archive.start
+        if resuming:
+            run_info['archive_start'] = extra.get('archive_start', sim.archive.start)
+            sim.archive.rewind(sim.generation, run_info['archive_start'])
+    archive = sim.archive
+
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+        stats_file = open(os.path.join(args.out, 'stats.jsonl'), 'a' if resuming else 'w')
+    else:
+        stats_file = None
+
+    # Results of the isolated worlds (--workers) or episode worlds (--episodes)
+    cache = FitnessCache(args.fitness_cache) if args.fitness_cache else None
+    evaluator = None
+    if args.workers:
+        from parallel import Evaluator, world_seed
+        evaluator = Evaluator(workers=None if args.workers < 0 else args.workers,
+                              world_size=args.world_size, steps=args.steps, stop_rules=stop_rules,
+                              cache=cache, settings=settings)
+
+    callbacks = []
+    recorder = None
+    if args.record:
+        from replay import ReplayRecorder
+        recorder = ReplayRecorder(args.record, every=args.record_every)
+        callbacks.append(recorder.record)
+    if args.render_every:
+        # Only import the visualizer (and so turtle) when asked for
+        from main import Renderer
+        callbacks.append(Renderer(sim.flow_field, every=args.render_every, settings=settings).draw)
+    on_step = _chain(callbacks)
+
+    try:
+        while sim.generation < args.generations:
+            start = time.perf_counter()
+            if args.episodes:
+                seeds = episode_seeds(seed, 0 if args.fixed_world else sim.generation, args.episodes)
+                weights = sim.state.genomes.weights
+                if evaluator:
+                    results = evaluator.evaluate_episodes(weights, seeds, args.aggregate, args.quantile)
+                else:
+                    results = evaluate_episodes(weights, seeds, args.steps, args.aggregate, args.quantile,
+                                                sim.flow_field, settings, cache)
+                sim.load_results(*results)
+                steps = args.steps
+            elif evaluator:
+                world = world_seed(seed, 0 if args.fixed_world else sim.generation)
+                sim.load_results(*evaluator.evaluate(sim.state.genomes.weights, world))
+                steps = args.steps
+            else:
+                steps = sim.run_generation(args.steps, on_step=on_step)
+            elapsed = time.perf_counter() - start
+
+            with profiler.phase('evolve'):
+                stats = sim.evolve(evaluated=evaluator is not None or bool(args.episodes))
+            timings = profiler.end_generation(stats['generation'])
+            stats['steps'] = steps
+            stats['steps_per_sec'] = steps / elapsed if elapsed > 0 else 0.0
+            stats['bot_steps_per_sec'] = stats['steps_per_sec'] * sim.population_size
+            if cache is not None:
+                stats.update(cache.stats())
+
+            print(f"Gen {stats['generation']}: best={stats['best_fitness']:.1f} "
+                  f"mean={stats['mean_fitness']:.1f} median={stats['median_fitness']:.1f} "
+                  f"food={stats['food_eaten']:g} survivors={stats['survivors']} "
+                  f"steps/s={stats['steps_per_sec']:.0f}")
+            if stats_file:
+                stats_file.write(json.dumps(stats) + '\n')
+                stats_file.flush()
+            if telemetry:
+                telemetry.publish(dict(stats, phases=timings['phases']))
+                telemetry.set_elite(sim.best_genome.weights, stats['best_fitness'], stats['generation'])
+            if args.checkpoint and (sim.generation % args.checkpoint_every == 0
+                                    or sim.generation == args.generations):
+                save_checkpoint(args.checkpoint, sim, extra=run_info)
+    finally:
+        if stats_file:
+            stats_file.close()
+        if evaluator:
+            evaluator.close()
+        if profile_log:
+            profile_log.close()
+        if archive:
+            archive.close()
+        if recorder:
+            recorder.close()
+        if telemetry:
+            telemetry.close()
+        if args.trace:
+            profiler.write_trace(args.trace)
+
+    if args.out and sim.best_genome is not None:
+        np.save(os.path.join(args.out, 'best_genome.npy'), sim.best_genome.weights)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='runner', description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('run', help='evolve a population headlessly')
+    p.add_argument('--generations', type=int, default=None,
+                   help='total generations to reach (a resumed run continues up to this)')
+    p.add_argument('--pop', type=int, default=None)
+    p.add_argument('--steps', type=int, default=None, help='maximum steps per generation')
+    p.add_argument('--set', nargs='+', action='extend', default=[], metavar='NAME=VALUE',
+                   help='override config settings for this run, e.g. --set HIDDEN_SIZE=16 MAX_SPEED=6')
+    p.add_argument('--seed', type=int, default=None)
+    p.add_argument('--out', default=None, help='directory for stats.jsonl and best_genome.npy')
+    p.add_argument('--render-every', type=int, default=0,
+                   help='draw every Nth frame with the turtle visualizer (0 = headless)')
+    p.add_argument('--flow', choices=['analytic', 'grid'], default=None,
+                   help='evaluate the flow formula per lookup or sample it once onto a grid')
+    p.add_argument('--flow-file', default=None, help='load a saved GridFlowField (.npz) instead')
+    p.add_argument('--workers', type=int, default=0,
+                   help='evaluate in isolated worlds on N processes (0 = one shared world, -1 = all cores)')
+    p.add_argument('--world-size', type=int, default=1,
+                   help='genomes per isolated world when --workers is set')
+    p.add_argument('--episodes', type=int, default=0, metavar='K',
+                   help='score every genome alone in the same K seeded worlds (0 = one shared world)')
+    p.add_argument('--aggregate', choices=AGGREGATES, default=config.EPISODE_AGGREGATE,
+                   help='how --episodes scores combine into one fitness')
+    p.add_argument('--quantile', type=float, default=config.EPISODE_QUANTILE,
+                   help='quantile used by --aggregate quantile')
+    p.add_argument('--fixed-world', action='store_true',
+                   help='with --workers or --episodes, evaluate every generation in the same seeded world(s)')
+    p.add_argument('--fitness-cache', type=int, default=0, metavar='N',
+                   help='with --workers or --episodes, remember up to N (genome, world) results and skip '
+                        're-simulating them')
+    p.add_argument('--early-stop', nargs='+', default=['all_dead'], metavar='RULE',
+                   help='end a generation early: all_dead, elites[:K], few_alive[:N]')
+    p.add_argument('--profile', default=None,
+                   help='write per-generation phase timings to this .jsonl or .csv file')
+    p.add_argument('--trace', default=None, help='write a Chrome trace (.json) of every timed phase')
+    p.add_argument('--telemetry', type=int, default=0, metavar='PORT',
+                   help='serve live stats, timings and the elite genome over HTTP/WebSocket on this port')
+    p.add_argument('--telemetry-host', default='127.0.0.1', help='address the telemetry server binds to')
+    p.add_argument('--checkpoint', default=None, help='checkpoint file written at generation boundaries')
+    p.add_argument('--checkpoint-every', type=int, default=1, help='generations between checkpoints')
+    p.add_argument('--resume', action='store_true', help='continue from --checkpoint if it exists')
+    p.add_argument('--record', default=None, help='record frames to this replay file (see python -m replay)')
+    p.add_argument('--record-every', type=int, default=1, help='record every Nth step')
+    p.add_argument('--archive', default=None, help='append every generation\'s top genomes to this archive file')
+    p.add_argument('--archive-top', type=int, default=None,
+                   help='genomes archived per generation (default: the elitism count)')
+    p.add_argument('--islands', type=int, default=0,
+                   help='evolve this many separate populations of --pop bots, one process each')
+    p.add_argument('--topology', choices=['ring', 'random'], default=config.MIGRATION_TOPOLOGY,
+                   help='where each island sends its migrants')
+    p.add_argument('--migration-interval', type=int, default=config.MIGRATION_INTERVAL,
+                   help='generations between migrations')
+    p.add_argument('--migrants', type=int, default=config.MIGRANT_COUNT,
+                   help='best genomes each island sends per migration')
+    p.set_defaults(func=run)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+
+"""Vectorized selection over a generation's fitness array.
+
+Each function returns population indices and draws everything it needs
+from ``rng`` in one batch, so picking the parents of a 100k generation is a
+handful of array operations instead of a Python loop over bots.
+
+    tournament  best of ``size`` distinct bots, per pick (the original rule)
+    rank        linear ranking: the i-th worst is picked with weight i
+    truncation  uniform among the best ``fraction`` of the population
+
+Ties always go the way a stable sort by fitness would send them: to the
+lower population index.
+"""
+
+import math
+import numpy as np
+
+SELECTIONS = ('tournament', 'rank', 'truncation')
+
+
+def ranking(fitness):
+    # All indices, best first (stable: equal fitness keeps index order)
+    return np.argsort(-np.asarray(fitness), kind='stable')
+
+
+def top_k(fitness, k):
+    # The k best indices, best first, without sorting the whole population
+    fitness = np.asarray(fitness)
+    n = len(fitness)
+    k = max(0, min(k, n))
+    if k == 0:
+        return np.zeros(0, dtype=int)
+    if k == n:
+        return ranking(fitness)
+    kth = -np.partition(-fitness, k - 1)[k - 1]
+    above = np.flatnonzero(fitness > kth)
+    # Of the bots tied with the k-th best, the lowest indices make the cut
+    tied = np.flatnonzero(fitness == kth)[:k - len(above)]
+    top = np.concatenate([above, tied])
+    return top[np.lexsort((top, -fitness[top]))]
+
+
+def tournament(fitness, count, rng, size=3):
+    # `count` winners of tournaments between `size` distinct bots. The
+    # entrants form a (count, size) index matrix drawn without replacement
+    # by Floyd's algorithm; the winner is the argmax of their fitness
+    fitness = np.asarray(fitness)
+    n = len(fitness)
+    size = max(1, min(size, n))
+    entrants = np.empty((count, size), dtype=int)
+    for c, j in enumerate(range(n - size, n)):
+        pick = rng.integers(0, j + 1, count)
+        taken = (entrants[:, :c] == pick[:, None]).any(axis=1)
+        entrants[:, c] = np.where(taken, j, pick)
+    scores = fitness[entrants]
+    # Lowest index among the best of each row, as in a stable sort
+    best = scores == scores.max(axis=1, keepdims=True)
+    return np.where(best, entrants, n).min(axis=1)
+
+
+def rank(fitness, count, rng):
+    # Linear ranking selection: worst has weight 1, best has weight n
+    order = ranking(fitness)
+    n = len(order)
+    weights = np.arange(n, 0, -1, dtype=float)
+    return order[rng.choice(n, count, p=weights / weights.sum())]
+
+
+def truncation(fitness, count, rng, fraction=0.2):
+    # Uniform picks among the best `fraction` (at least one bot)
+    n = len(fitness)
+    keep = top_k(fitness, max(1, math.ceil(fraction * n)))
+    return keep[rng.integers(0, len(keep), count)]
+
+
+def select(fitness, count, rng, method='tournament', tournament_size=3, truncation_fraction=0.2):
+    # `count` parent indices chosen by `method`
+    if method == 'tournament':
+        return tournament(fitness, count, rng, tournament_size)
+    if method == 'rank':
+        return rank(fitness, count, rng)
+    if method == 'truncation':
+        return truncation(fitness, count, rng, truncation_fraction)
+    raise ValueError(f"Unknown selection method: {method!r} (choose from {', '.join(SELECTIONS)})")
@@ -0,0 +1,58 @@
+
+import math
+import numpy as np
+import config
+
+# Cap on bots x rays x obstacles elements per broadcast chunk
+CHUNK_ELEMENTS = 1 << 22
+
+
+def ray_offsets(count=config.RAY_COUNT, spread=config.RAY_SPREAD):
+    # `count` ray angles (radians, relative to heading) spread evenly over
+    # `spread` degrees; a single ray points straight ahead
+    if count == 1:
+        return np.zeros(1)
+    half = math.radians(spread) / 2
+    return np.linspace(-half, half, count)
+
+
+RAY_ANGLES = ray_offsets()
+
+
+def cast_rays(pos, angles, obs_pos, obs_radius, sight_range=config.SIGHT_RANGE):
+    """Distance along every ray to the first obstacle it enters.
+
+    ``pos`` is (N, 2) and ``angles`` (N, R) global ray angles; obstacles are
+    (K, 2) centres and (K,) radii shared by every bot, or (N, K, 2) and
+    (N, K) giving each bot its own set. Each chunk of bots is projected onto
+    every obstacle as one (n, R, K) broadcast and reduced with a masked
+    minimum. Rays that hit nothing report ``sight_range``; a bot inside an
+    obstacle gets a negative distance, as in ``Bot.sense``.
+    """
+    dist = np.full(np.shape(angles), float(sight_range))
+    shared = np.ndim(obs_radius) == 1
+    if np.shape(obs_radius)[-1] == 0 or len(pos) == 0:
+        return dist
+
+    chunk = max(1, CHUNK_ELEMENTS // (dist.shape[1] * np.shape(obs_radius)[-1]))
+    for start in range(0, len(pos), chunk):
+        p = pos[start:start + chunk]
+        a = angles[start:start + chunk]
+        o = obs_pos[None] if shared else obs_pos[start:start + chunk]
+        radius = obs_radius if shared else obs_radius[start:start + chunk, None, :]
+        rx = np.cos(a)[:, :, None]
+        ry = np.sin(a)[:, :, None]
+        ox = (o[:, :, 0] - p[:, 0, None])[:, None, :]
+        oy = (o[:, :, 1] - p[:, 1, None])[:, None, :]
+
+        projection = ox * rx + oy * ry
+        dist_to_ray = np.hypot(rx * projection - ox, ry * projection - oy)
+        hit = (projection > 0) & (dist_to_ray < radius)
+        entry = projection - np.sqrt(np.maximum(radius**2 - dist_to_ray**2, 0))
+        dist[start:start + chunk] = np.minimum(np.where(hit, entry, sight_range).min(axis=2), sight_range)
+    return dist
+
+
+def readings(dist, sight_range=config.SIGHT_RANGE):
+    # 1.0 = touching an obstacle, 0.0 = nothing within sight
+    return 1.0 - np.maximum(0, dist) / sight_range
@@ -1,120 +1,374 @@
-
-import config
-from bot import Bot
-import random
-import math
-
-class Simulation:
-    def __init__(self):
-        self.population = [Bot(pos_x=-300, pos_y=random.uniform(-100, 100)) for _ in range(config.POPULATION_SIZE)]
-        self.generation = 0
-        self.obstacles = self.generate_obstacles()
-        self.foods = self.generate_food()
-        self.target_pos = (350, 0)
-        
-    def generate_obstacles(self):
-        obs = []
-        for _ in range(5):
-            angle = random.uniform(0, 2*math.pi)
-            speed = config.OBSTACLE_SPEED
-            obs.append({
-                'pos': [random.uniform(-100, 200), random.uniform(-200, 200)],
-                'radius': random.uniform(15, 30),
-                'vel': [math.cos(angle) * speed, math.sin(angle) * speed]
-            })
-        return obs
-
-    def generate_food(self):
-        foods = []
-        for _ in range(config.FOOD_COUNT):
-            foods.append(self.create_one_food())
-        return foods
-
-    def create_one_food(self):
-        return {
-            'pos': [random.uniform(-350, 350), random.uniform(-250, 250)],
-            'energy': config.FOOD_ENERGY_VALUE
-        }
-        
-    def get_flow_force(self, x, y):
-        # Chaotic Flow Field: Sine/Cosine based on position
-        # Flow(x,y) = (cos(y/scale), sin(x/scale)) * strength
-        scale = config.FLUID_SCALE
-        strength = config.FLUID_STRENGTH
-        
-        fx = math.cos(y / scale) * strength
-        fy = math.sin(x / scale) * strength
-        
-        # Add a constant drift to the right so they don't just get stuck in loops forever
-        fx += 0.2
-        
-        return (fx, fy)
-        
-    def update(self):
-        self.update_obstacles()
-        
-        alive_count = 0
-        for bot in self.population:
-            if not bot.alive:
-                continue
-                
-            # Calculate local fluid force
-            fluid_force = self.get_flow_force(bot.pos[0], bot.pos[1])
-            
-            bot.update(fluid_force, self.obstacles, self.foods)
-            
-            # Check Food Collision (handled here to sync with shared list)
-            # Iterate copy to modify original
-            for i in range(len(self.foods) - 1, -1, -1):
-                food = self.foods[i]
-                dist = math.hypot(bot.pos[0] - food['pos'][0], bot.pos[1] - food['pos'][1])
-                if dist < 15: # Bot radius ~5 + Food radius ~10
-                    bot.energy += food['energy']
-                    bot.food_eaten += 1
-                    # Respawn food immediately elsewhere
-                    self.foods[i] = self.create_one_food()
-
-            if bot.alive:
-                alive_count += 1
-                
-        return alive_count
-
-    def update_obstacles(self):
-        w, h = config.SCREEN_WIDTH/2, config.SCREEN_HEIGHT/2
-        for obs in self.obstacles:
-            obs['pos'][0] += obs['vel'][0]
-            obs['pos'][1] += obs['vel'][1]
-            if obs['pos'][0] < -w + obs['radius'] or obs['pos'][0] > w - obs['radius']: obs['vel'][0] *= -1
-            if obs['pos'][1] < -h + obs['radius'] or obs['pos'][1] > h - obs['radius']: obs['vel'][1] *= -1
-
-    def calculate_fitness(self):
-        for bot in self.population:
-            bot.calculate_fitness(self.target_pos)
-
-    def evolve(self):
-        self.calculate_fitness()
-        self.population.sort(key=lambda b: b.fitness, reverse=True)
-        
-        print(f"Gen {self.generation}: Best Fitness={self.population[0].fitness:.1f}, Food Eaten={self.population[0].food_eaten}")
-        
-        new_pop = []
-        for i in range(config.ELITISM_COUNT):
-            child = Bot(pos_x=-300, pos_y=random.uniform(-100, 100), genome=self.population[i].genome)
-            new_pop.append(child)
-            
-        while len(new_pop) < config.POPULATION_SIZE:
-            p1 = self.select_parent()
-            p2 = self.select_parent()
-            child_genome = p1.genome.crossover(p2.genome)
-            child_genome.mutate()
-            new_pop.append(Bot(pos_x=-300, pos_y=random.uniform(-100, 100), genome=child_genome))
-            
-        self.population = new_pop
-        self.generation += 1
-        # self.obstacles = self.generate_obstacles() # Keep dynamic or reset?
-        self.foods = self.generate_food() # Reset food distribution
-
-    def select_parent(self):
-        tournament = random.sample(self.population, 3)
-        tournament.sort(key=lambda b: b.fitness, reverse=True)
-        return tournament[0]
+
+import config
+from bot import Bot
+from genome import GenomeStack, random_weights, crossover_weights, mutate_weights
+from population import PopulationState, food_vectors, fitness_scores
+import selection
+import sensors
+from flow import make_flow_field
+from physics import Physics
+from profiling import Profiler
+from stopping import AllDead
+from spatial import SpatialGrid
+from world import ChunkedWorld, arena_size, uses_chunks
+from kernels import make_step
+import math
+import numpy as np
+
+FOOD_CONFLICTS = ('nearest', 'split')
+
+
+class Simulation:
+    def __init__(self, population_size=None, verbose=True, genomes=None, flow_field=None,
+                 seed=None, rng=None, food_count=None, obstacle_count=None,
+                 profiler=None, stop_rules=None, physics=None, archive=None, settings=None, world=None):
+        # settings: a config.Settings (default: the config module). Every
+        # constant below, in the bots, their genomes and the physics comes
+        # from it, so differently configured runs can share a process
+        self.settings = settings = settings if settings is not None else config
+        if settings.FOOD_CONFLICT not in FOOD_CONFLICTS:
+            raise ValueError(f"Unknown food conflict rule: {settings.FOOD_CONFLICT!r} "
+                             f"(choose from {', '.join(FOOD_CONFLICTS)})")
+        self.ray_angles = sensors.ray_offsets(settings.RAY_COUNT, settings.RAY_SPREAD)
+        # Every random draw (world, start positions, selection, crossover,
+        # mutation) comes from self.rng, so a seed reproduces the whole run
+        self.rng = rng if rng is not None else np.random.default_rng(seed)
+        # Disabled unless a caller passes (or later enables) a profiler
+        self.profiler = profiler if profiler is not None else Profiler()
+        self.stop_rules = stop_rules if stop_rules is not None else [AllDead()]
+        # Optional archive.GenomeArchive that evolve() adds the top genomes to
+        self.archive = archive
+
+        # The world is generated before the population so that, for a given
+        # seed, it doesn't depend on how many bots are put into it
+        self.generation = 0
+        self.food_count = settings.FOOD_COUNT if food_count is None else food_count
+        self.obstacle_count = settings.OBSTACLE_COUNT if obstacle_count is None else obstacle_count
+        self.flow_field = flow_field if flow_field is not None else make_flow_field(settings=settings)
+        # A world.ChunkedWorld (passed in, or asked for by WORLD_WIDTH/HEIGHT)
+        # replaces the classic arena's fixed food and obstacles with chunks
+        # generated around the living bots
+        if world is None and uses_chunks(settings):
+            world = ChunkedWorld(*arena_size(settings), seed=int(self.rng.integers(2**63)), settings=settings)
+        self.world = world
+        if world is None:
+            w, h = settings.SCREEN_WIDTH/2, settings.SCREEN_HEIGHT/2
+            self.food_extent = (w - 50, h - 50)
+            self.start_x = -w + 100
+            self.target_pos = (w - 50, 0)
+            self.set_obstacles(self.generate_obstacles())
+            self.set_foods(self.generate_food())
+            bounds = (w, h)
+        else:
+            self.start_x = world.start_x
+            self.target_pos = world.target_pos
+            self.obstacles, self.foods = [], []
+            self._adopt_world()
+            bounds = world.half
+        self.physics = physics if physics is not None else Physics(settings=settings, bounds=bounds)
+        # kernels.FusedStep when settings.BACKEND asks for the fused kernel
+        self.kernel = make_step(settings)
+
+        if genomes is None:
+            if population_size is None:
+                population_size = settings.POPULATION_SIZE
+            genomes = GenomeStack(random_weights(population_size, self.rng, settings), settings)
+        self.population_size = len(genomes)
+        self.verbose = verbose
+        self.state = None
+        self.spawn_population(genomes)
+        self.best_genome = None
+        
+    def spawn_population(self, genomes, start_pos=None):
+        # All bot state lives in one PopulationState, reset in place when the
+        # next generation has the same size
+        if start_pos is None:
+            start_pos = np.empty((len(genomes), 2))
+            start_pos[:, 0] = self.start_x
+            start_pos[:, 1] = self.rng.uniform(-100, 100, len(genomes))
+        if self.state is not None and self.state.size == len(genomes):
+            self.state.reset(genomes, start_pos)
+        else:
+            self.state = PopulationState(genomes, start_pos, settings=self.settings)
+            self._population = None
+
+    @property
+    def population(self):
+        # Thin Bot views onto the state's rows, for rendering and per-bot
+        # code; built on first use, as the step and evolve paths never need them
+        if self._population is None:
+            self._population = [Bot(state=self.state, index=i) for i in range(self.state.size)]
+        return self._population
+
+    def generate_obstacles(self):
+        obs = []
+        for _ in range(self.obstacle_count):
+            angle = self.rng.uniform(0, 2*math.pi)
+            speed = self.settings.OBSTACLE_SPEED
+            obs.append({
+                'pos': [self.rng.uniform(-100, 200), self.rng.uniform(-200, 200)],
+                'radius': self.rng.uniform(15, 30),
+                'vel': [math.cos(angle) * speed, math.sin(angle) * speed]
+            })
+        return obs
+
+    def generate_food(self):
+        foods = []
+        for _ in range(self.food_count):
+            foods.append(self.create_one_food())
+        return foods
+
+    def create_one_food(self):
+        return {
+            'pos': [self.rng.uniform(-self.food_extent[0], self.food_extent[0]),
+                    self.rng.uniform(-self.food_extent[1], self.food_extent[1])],
+            'energy': self.settings.FOOD_ENERGY_VALUE
+        }
+
+    def set_obstacles(self, obstacles):
+        # Obstacle state lives in arrays indexed by a spatial grid; the dicts
+        # in self.obstacles keep 'pos'/'vel' as row views for the renderer
+        self.obstacle_pos = np.array([obs['pos'] for obs in obstacles], dtype=float).reshape(-1, 2)
+        self.obstacle_vel = np.array([obs['vel'] for obs in obstacles], dtype=float).reshape(-1, 2)
+        self.obstacle_radius = np.array([obs['radius'] for obs in obstacles], dtype=float)
+        self.obstacles = [{'pos': self.obstacle_pos[k], 'radius': obs['radius'], 'vel': self.obstacle_vel[k]}
+                          for k, obs in enumerate(obstacles)]
+        self.obstacle_grid = SpatialGrid(self.settings.GRID_CELL_SIZE, self.obstacle_pos, self.obstacle_radius)
+
+    def set_foods(self, foods):
+        self.food_pos = np.array([food['pos'] for food in foods], dtype=float).reshape(-1, 2)
+        self.food_energy = np.array([food['energy'] for food in foods], dtype=float)
+        self.foods = [{'pos': self.food_pos[j], 'energy': food['energy']} for j, food in enumerate(foods)]
+        self.food_grid = SpatialGrid(self.settings.GRID_CELL_SIZE, self.food_pos)
+
+    def _adopt_world(self):
+        # Point the world arrays the step uses at the chunked world's
+        # (rebuilt whenever its loaded chunks change)
+        world = self.world
+        self.obstacle_pos, self.obstacle_vel = world.obstacle_pos, world.obstacle_vel
+        self.obstacle_radius, self.obstacle_grid = world.obstacle_radius, world.obstacle_grid
+        self.food_pos, self.food_energy, self.food_grid = world.food_pos, world.food_energy, world.food_grid
+
+    def respawn_food(self, j):
+        self.respawn_foods(np.atleast_1d(j))
+
+    def respawn_foods(self, ids):
+        # Respawn the food items in `ids` elsewhere in one draw (the same
+        # draws as that many create_one_food calls), updating only their
+        # grid cells
+        if self.world is not None:
+            self.world.respawn_foods(ids)
+            return
+        fx, fy = self.food_extent
+        self.food_pos[ids] = self.rng.uniform([-fx, -fy], [fx, fy], (len(ids), 2))
+        self.food_energy[ids] = self.settings.FOOD_ENERGY_VALUE
+        self.food_grid.move(ids, self.food_pos[ids])
+        
+    def get_flow_force(self, x, y):
+        return self.flow_field.force(x, y)
+
+    def get_flow_forces(self, pos):
+        # Batched get_flow_force over an (N, 2) array of positions
+        return self.flow_field.sample(pos)
+
+    def update(self):
+        prof = self.profiler
+        with prof.phase('update_obstacles'):
+            self.update_obstacles()
+
+        state = self.state
+        if self.kernel is not None:
+            # Energy..physics for every living bot in one compiled pass
+            with prof.phase('fused_step'):
+                eaters = self.kernel.step(self, state.compact())
+            with prof.phase('eat_food'):
+                self.eat_food(eaters)
+            prof.end_step()
+            return len(state.compact())
+
+        with prof.phase('energy'):
+            active = state.drain_energy()
+            if len(active) == 0:
+                prof.end_step()
+                return 0
+
+        with prof.phase('flow'):
+            # Local fluid force for every living bot at once (a brain input,
+            # and the first substep's flow force)
+            fluid_force = self.get_flow_forces(state.pos[active])
+
+        # Sense: all rays of all bots in one pass; with many obstacles the
+        # grid narrows each cell's bots down to the obstacles in range
+        with prof.phase('sense'):
+            pos = state.pos[active]
+            angles = state.angle[active, None] + self.ray_angles
+            sight_range = self.settings.SIGHT_RANGE
+            if len(self.obstacle_radius) < self.settings.OBSTACLE_GRID_MIN:
+                sight = sensors.cast_rays(pos, angles, self.obstacle_pos, self.obstacle_radius, sight_range)
+            else:
+                sight = self.obstacle_grid.raycast_many(pos, angles, sight_range)
+            state.sensor_readings[active] = sensors.readings(sight, sight_range)
+        with prof.phase('nearest_food'):
+            food_vec = food_vectors(pos, self.food_pos, self.food_grid.nearest_many(pos))
+
+        # Think
+        with prof.phase('inference'):
+            inputs = state.brain_inputs(active, fluid_force, food_vec)
+            outputs = state.genomes.feed_forward(inputs, active)
+
+        with prof.phase('act'):
+            state.act(active, outputs)
+        # Integrate + wall/obstacle collisions
+        with prof.phase('physics'):
+            self.physics.step(state, active, self.flow_field, self.obstacle_pos,
+                              self.obstacle_radius, self.obstacle_grid, fluid_force)
+
+        with prof.phase('eat_food'):
+            # Bots that crashed this step still get to eat, as before
+            self.eat_food(active)
+
+        prof.end_step()
+        return len(state.compact())
+
+    def eat_food(self, active):
+        # Food is eaten after every bot has moved: all (bot, food) contacts
+        # come from one grid query, each contested item is resolved by
+        # settings.FOOD_CONFLICT, and every eaten item respawns at once
+        state = self.state
+        pos = state.pos[active]
+        rows, food_ids = self.food_grid.query_radius_many(pos, 15)  # Bot radius ~5 + Food radius ~10
+        if len(rows) == 0:
+            return
+        bots = active[rows]
+        if self.settings.FOOD_CONFLICT == 'nearest':
+            # One winner per item: the closest bot, ties to the lower index
+            delta = self.food_pos[food_ids] - pos[rows]
+            dist = np.hypot(delta[:, 0], delta[:, 1])
+            order = np.lexsort((bots, dist, food_ids))
+            first = np.r_[True, food_ids[order][1:] != food_ids[order][:-1]]
+            bots, food_ids = bots[order[first]], food_ids[order[first]]
+            energy = self.food_energy[food_ids]
+            share = 1.0
+        else:
+            # Every bot touching an item gets an equal share of it: of its
+            # energy and of the item in food_eaten, so a contested item is
+            # worth no more fitness in total than an uncontested one
+            counts = np.bincount(food_ids, minlength=len(self.food_energy))
+            share = 1.0 / counts[food_ids]
+            energy = self.food_energy[food_ids] / counts[food_ids]
+        # A bot can eat several items in one step
+        np.add.at(state.energy, bots, energy)
+        np.add.at(state.food_eaten, bots, share)
+        # Respawn food immediately elsewhere
+        self.respawn_foods(np.unique(food_ids))
+
+    def run_generation(self, steps=None, on_step=None):
+        # Step until time runs out or an early-stop rule fires (by default:
+        # every bot is dead); on_step(sim, step) lets a consumer (e.g. the
+        # turtle renderer) observe each frame
+        if steps is None:
+            steps = self.settings.SIMULATION_STEPS
+        for step in range(steps):
+            self.update()
+            if on_step:
+                with self.profiler.phase('render'):
+                    on_step(self, step)
+            if any(rule.should_stop(self, step + 1, steps) for rule in self.stop_rules):
+                break
+        return step + 1
+
+    def update_obstacles(self):
+        if self.world is not None:
+            # Also loads the chunks the living bots have moved next to
+            self.world.update(self.state.pos[self.state.compact()])
+            self._adopt_world()
+            return
+        w, h = self.physics.bounds
+        pos, vel, radius = self.obstacle_pos, self.obstacle_vel, self.obstacle_radius
+        pos += vel
+        vel[(pos[:, 0] < -w + radius) | (pos[:, 0] > w - radius), 0] *= -1
+        vel[(pos[:, 1] < -h + radius) | (pos[:, 1] > h - radius), 1] *= -1
+        self.obstacle_grid.move(np.arange(len(pos)), pos)
+
+    def calculate_fitness(self):
+        # Bot.calculate_fitness for every bot at once
+        state = self.state
+        dist = np.hypot(state.pos[:, 0] - self.target_pos[0], state.pos[:, 1] - self.target_pos[1])
+        state.fitness[:] = fitness_scores(state.crashed, state.alive, state.food_eaten, dist)
+
+    def load_results(self, fitness, food_eaten, alive):
+        # Adopt per-bot results computed elsewhere (e.g. parallel.Evaluator)
+        # in place of running this generation locally
+        self.state.fitness[:] = fitness
+        self.state.food_eaten[:] = food_eaten
+        self.state.alive[:] = alive
+        self.state.compact()
+
+    def evolve(self, evaluated=False):
+        # evaluated=True means fitness was already filled in by load_results
+        if not evaluated:
+            self.calculate_fitness()
+        state = self.state
+        fitness = state.fitness
+        weights = state.genomes.weights
+        elite_count = min(self.settings.ELITISM_COUNT, self.population_size)
+        archive_count = self.archive.top if self.archive is not None else 0
+        # The fittest bots, best first (ties to the lower index)
+        ranked = selection.top_k(fitness, max(1, elite_count, archive_count))
+        stats = self.generation_stats()
+        self.best_genome = state.genomes[ranked[0]]
+        if self.archive is not None:
+            top = ranked[:archive_count]
+            self.archive.append(self.generation, fitness[top], weights[top])
+
+        if self.verbose:
+            print(f"Gen {self.generation}: Best Fitness={fitness[ranked[0]]:.1f}, Food Eaten={state.food_eaten[ranked[0]]:g}")
+
+        # Assemble the next generation directly as one weight matrix
+        new_weights = np.empty((self.population_size, weights.shape[1]))
+        new_weights[:elite_count] = weights[ranked[:elite_count]]
+
+        child_count = self.population_size - elite_count
+        if child_count:
+            p1, p2 = self.select_parents(2 * child_count).reshape(child_count, 2).T
+            children = crossover_weights(weights[p1], weights[p2], self.rng)
+            mutate_weights(children, self.rng, self.settings)
+            new_weights[elite_count:] = children
+
+        self.spawn_population(GenomeStack(new_weights, self.settings))
+        self.generation += 1
+        # self.obstacles = self.generate_obstacles() # Keep dynamic or reset?
+        # Reset food distribution
+        if self.world is not None:
+            self.world.reset(self.generation)
+            self._adopt_world()
+        else:
+            self.set_foods(self.generate_food())
+        return stats
+
+    def generation_stats(self):
+        # Summary of the finished generation (call after calculate_fitness)
+        state = self.state
+        best = int(np.argmax(state.fitness))
+        stats = {
+            'generation': self.generation,
+            'best_fitness': float(state.fitness[best]),
+            'mean_fitness': float(state.fitness.mean()),
+            'median_fitness': float(np.median(state.fitness)),
+            'best_food_eaten': float(state.food_eaten[best]),
+            'food_eaten': float(state.food_eaten.sum()),
+            'survivors': int(np.count_nonzero(state.alive)),
+        }
+        if self.world is not None:
+            # Most chunks loaded at once this generation
+            stats['chunks'] = self.world.peak_chunks
+        return stats
+
+    def select_parents(self, count):
+        # `count` parent indices by the configured selection method
+        settings = self.settings
+        return selection.select(self.state.fitness, count, self.rng, settings.SELECTION,
+                                settings.TOURNAMENT_SIZE, settings.TRUNCATION_FRACTION)
+
+    def select_parent(self):
+        return self.population[self.select_parents(1)[0]]
@@ -0,0 +1,166 @@
+
+import math
+import numpy as np
+from sensors import cast_rays
+
+
+class SpatialGrid:
+    """Uniform hash grid over circular items (food, obstacles).
+
+    Item ids are row numbers of ``pos``. An item is bucketed into every cell
+    its bounding box overlaps, so queries only have to look at the cells
+    around the query point. ``move`` re-buckets only items whose cell
+    footprint actually changed.
+
+    The ``*_many`` queries take an (N, 2) array of points and group them by
+    cell, so the Python-level work scales with occupied cells, not points.
+    """
+
+    def __init__(self, cell_size, pos=(), radius=None):
+        self.cell_size = float(cell_size)
+        self.build(pos, radius)
+
+    def build(self, pos, radius=None):
+        # (Re)index every item from scratch
+        self.pos = np.array(pos, dtype=float).reshape(-1, 2)
+        if radius is None:
+            self.radius = np.zeros(len(self.pos))
+        else:
+            self.radius = np.array(radius, dtype=float).reshape(-1)
+        self.cells = {}
+        self.bbox = self._bbox(self.pos, self.radius)
+        for i, box in enumerate(self.bbox):
+            self._add(i, box)
+
+    def extend(self, pos, radius=None):
+        # Append items (ids continue from len(self)), bucketing only the new
+        # ones; returns their ids
+        pos = np.array(pos, dtype=float).reshape(-1, 2)
+        radius = np.zeros(len(pos)) if radius is None else np.array(radius, dtype=float).reshape(-1)
+        first = len(self.pos)
+        bbox = self._bbox(pos, radius)
+        self.pos = np.concatenate([self.pos, pos])
+        self.radius = np.concatenate([self.radius, radius])
+        self.bbox = np.concatenate([self.bbox, bbox])
+        for k, box in enumerate(bbox):
+            self._add(first + k, box)
+        return np.arange(first, first + len(pos))
+
+    def __len__(self):
+        return len(self.pos)
+
+    def _bbox(self, pos, radius):
+        # Inclusive cell range (cx0, cy0, cx1, cy1) covered by each item
+        lo = np.floor((pos - radius[:, None]) / self.cell_size).astype(int)
+        hi = np.floor((pos + radius[:, None]) / self.cell_size).astype(int)
+        return np.concatenate([lo, hi], axis=1)
+
+    def _add(self, i, box):
+        for cx in range(box[0], box[2] + 1):
+            for cy in range(box[1], box[3] + 1):
+                self.cells.setdefault((cx, cy), set()).add(i)
+
+    def _discard(self, i, box):
+        for cx in range(box[0], box[2] + 1):
+            for cy in range(box[1], box[3] + 1):
+                cell = self.cells[(cx, cy)]
+                cell.discard(i)
+                if not cell:
+                    del self.cells[(cx, cy)]
+
+    def move(self, ids, pos):
+        # Incremental update of one id or an array of ids
+        ids = np.atleast_1d(ids)
+        pos = np.reshape(pos, (-1, 2))
+        self.pos[ids] = pos
+        new = self._bbox(pos, self.radius[ids])
+        for k in np.flatnonzero((new != self.bbox[ids]).any(axis=1)):
+            i = ids[k]
+            self._discard(i, self.bbox[i])
+            self._add(i, new[k])
+            self.bbox[i] = new[k]
+
+    def candidates(self, cx, cy, reach):
+        # Sorted ids bucketed within `reach` cells (Chebyshev) of cell (cx, cy)
+        found = set()
+        for x in range(cx - reach, cx + reach + 1):
+            for y in range(cy - reach, cy + reach + 1):
+                cell = self.cells.get((x, y))
+                if cell:
+                    found |= cell
+        return np.array(sorted(found), dtype=int)
+
+    def _groups(self, points):
+        # Yield (cx, cy, rows) for the points falling in each occupied cell
+        cells = np.floor(points / self.cell_size).astype(int)
+        keys, inverse = np.unique(cells, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        order = np.argsort(inverse, kind='stable')
+        bounds = np.searchsorted(inverse[order], np.arange(len(keys) + 1))
+        for g, (cx, cy) in enumerate(keys):
+            yield cx, cy, order[bounds[g]:bounds[g + 1]]
+
+    def nearest_many(self, points):
+        # Id of the item centre nearest to each point (first id on ties, -1 if empty)
+        points = np.reshape(points, (-1, 2))
+        nearest = np.full(len(points), -1)
+        if not self.cells:
+            return nearest
+        lo = self.bbox[:, :2].min(axis=0)
+        hi = self.bbox[:, 2:].max(axis=0)
+        for cx, cy, rows in self._groups(points):
+            # Cells from here to the farthest occupied cell
+            limit = int(max(abs(lo[0] - cx), abs(hi[0] - cx), abs(lo[1] - cy), abs(hi[1] - cy)))
+            reach = 0
+            cand = self.candidates(cx, cy, reach)
+            while len(cand) == 0 and reach < limit:
+                reach += 1
+                cand = self.candidates(cx, cy, reach)
+            if len(cand) == 0:
+                continue
+            # Anything closer than the best candidate lies within ceil(d / cell)
+            dist = self._distances(points[rows], cand)
+            needed = min(limit, int(math.ceil(dist.min(axis=1).max() / self.cell_size)))
+            if needed > reach:
+                cand = self.candidates(cx, cy, needed)
+                dist = self._distances(points[rows], cand)
+            nearest[rows] = cand[dist.argmin(axis=1)]
+        return nearest
+
+    def query_radius_many(self, points, r):
+        # (point_row, item_id) pairs where the disc of radius r around the
+        # point overlaps the item's disc, sorted by point row then item id
+        points = np.reshape(points, (-1, 2))
+        reach = int(math.ceil(r / self.cell_size))
+        found_rows, found_ids = [], []
+        for cx, cy, rows in self._groups(points):
+            cand = self.candidates(cx, cy, reach)
+            if len(cand) == 0:
+                continue
+            hit = self._distances(points[rows], cand) < r + self.radius[cand]
+            row_k, cand_k = np.nonzero(hit)
+            found_rows.append(rows[row_k])
+            found_ids.append(cand[cand_k])
+        if not found_rows:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+        found_rows = np.concatenate(found_rows)
+        found_ids = np.concatenate(found_ids)
+        order = np.lexsort((found_ids, found_rows))
+        return found_rows[order], found_ids[order]
+
+    def raycast_many(self, points, angles, max_dist):
+        # Distance along each ray (points (N, 2), global angles (N, R)) to the
+        # first item it enters, or max_dist if nothing is hit within range
+        points = np.reshape(points, (-1, 2))
+        dist = np.full(np.shape(angles), float(max_dist))
+        reach = int(math.ceil(max_dist / self.cell_size))
+        for cx, cy, rows in self._groups(points):
+            cand = self.candidates(cx, cy, reach)
+            if len(cand) == 0:
+                continue
+            dist[rows] = cast_rays(points[rows], angles[rows], self.pos[cand], self.radius[cand], max_dist)
+        return dist
+
+    def _distances(self, points, cand):
+        return np.hypot(points[:, 0, None] - self.pos[cand, 0][None, :],
+                        points[:, 1, None] - self.pos[cand, 1][None, :])
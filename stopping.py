@@ -0,0 +1,109 @@
+"""Early-stop rules for a generation.
+
+``Simulation.run_generation`` asks each rule ``should_stop(sim, step,
+steps)`` after every step (``step`` steps done out of ``steps``) and ends
+the generation as soon as one says yes. Bots still alive at that point are
+scored as survivors, exactly as if time had run out.
+"""
+
+import math
+import numpy as np
+from flow import AnalyticFlowField, GridFlowField
+from population import fitness_scores
+
+
+class AllDead:
+    # The original rule: nothing left to simulate
+    def should_stop(self, sim, step, steps):
+        return len(sim.state.active) == 0
+
+
+class FewAlive:
+    # Stop once fewer than `count` bots are left alive
+    def __init__(self, count=1):
+        self.count = count
+
+    def should_stop(self, sim, step, steps):
+        return len(sim.state.active) < self.count
+
+
+class ElitesDecided:
+    """Stop once the top ``count`` places can no longer change.
+
+    Dead bots' fitness is final. A living bot's fitness is bounded above by
+    surviving, moving straight at the target as far as a step can carry it
+    and eating every food item on every remaining step. When at least
+    ``count`` dead bots beat that bound for every living bot, the elites are
+    decided. The check touches the whole population, so it runs every
+    ``every`` steps.
+
+    A step covers at most MAX_SPEED * dt under 'euler'. Under 'verlet' a
+    substep moves a bot by v*h + a*h^2/2 before its speed is limited, so the
+    bound adds the largest possible acceleration (flow + drag + thrust); a
+    flow field other than AnalyticFlowField or GridFlowField has no known
+    bound and disables the rule. So does a world.ChunkedWorld, whose food
+    count grows as chunks load.
+
+    ``count`` defaults to the simulation's own ``settings.ELITISM_COUNT``.
+    """
+
+    def __init__(self, count=None, every=10):
+        self.count = count
+        self.every = every
+
+    def should_stop(self, sim, step, steps):
+        if step % self.every:
+            return False
+        count = max(1, self.count if self.count is not None else sim.settings.ELITISM_COUNT)
+        state = sim.state
+        dead = ~state.alive
+        if np.count_nonzero(dead) < count:
+            return False
+
+        dist = np.hypot(state.pos[:, 0] - sim.target_pos[0], state.pos[:, 1] - sim.target_pos[1])
+        final = fitness_scores(state.crashed[dead], False, state.food_eaten[dead], dist[dead])
+        kth_best = np.partition(final, len(final) - count)[len(final) - count]
+
+        active = state.active
+        if len(active) == 0:
+            return True
+        reach = step_reach(sim)
+        if reach is None or sim.world is not None:
+            return False
+        remaining = steps - step
+        best_case = fitness_scores(False, True,
+                                   state.food_eaten[active] + remaining * len(sim.food_pos),
+                                   np.maximum(0, dist[active] - remaining * reach))
+        return kth_best > best_case.max()
+
+
+def step_reach(sim):
+    # Upper bound on how far one step can move a bot, or None if unknown
+    settings, physics = sim.settings, sim.physics
+    reach = settings.MAX_SPEED * physics.dt
+    if physics.method == 'verlet':
+        flow = sim.flow_field
+        if isinstance(flow, AnalyticFlowField):
+            max_flow = math.hypot(abs(flow.strength) + abs(flow.drift), abs(flow.strength))
+        elif isinstance(flow, GridFlowField):
+            max_flow = float(np.hypot(flow.values[..., 0], flow.values[..., 1]).max(initial=0.0))
+        else:
+            return None
+        max_acc = max_flow + settings.DRAG_COEFFICIENT * settings.MAX_SPEED**2 + settings.THRUST_POWER
+        h = physics.dt / physics.substeps
+        reach += physics.substeps * 0.5 * max_acc * h * h
+    return reach
+
+
+RULES = {'all_dead': AllDead, 'few_alive': FewAlive, 'elites': ElitesDecided}
+
+
+def parse_rules(specs):
+    # 'name' or 'name:arg' strings, e.g. ['all_dead', 'elites:2', 'few_alive:5']
+    rules = []
+    for spec in specs:
+        name, _, arg = spec.partition(':')
+        if name not in RULES:
+            raise ValueError(f"Unknown early-stop rule: {name!r} (choose from {', '.join(RULES)})")
+        rules.append(RULES[name](int(arg)) if arg else RULES[name]())
+    return rules
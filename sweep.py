@@ -0,0 +1,199 @@
+
+"""Parameter sweeps over config settings.
+
+A sweep spec is a JSON file naming the settings to vary and how:
+
+    {
+        "mode": "grid",
+        "params": {"FLUID_STRENGTH": [0.3, 0.5, 0.8], "HIDDEN_SIZE": [8, 16]},
+        "base": {"POPULATION_SIZE": 100},
+        "seeds": [0, 1, 2],
+        "generations": 20
+    }
+
+``grid`` runs the cross product of the listed values. ``random`` draws
+``samples`` configurations, each param given as ``{"uniform": [lo, hi]}``,
+``{"log_uniform": [lo, hi]}`` or ``{"choice": [...]}`` (a plain list means
+choice), from ``sample_seed``. Values are cast to the type of the config
+default, so integer settings sampled from a range are rounded. ``base``
+applies to every configuration. Every configuration runs once per seed.
+
+Each run builds its own config.Settings and evolves a Simulation in a
+worker process; only the settings go out and one row of metrics comes back.
+Rows are appended to a single CSV as runs finish:
+
+    python -m sweep spec.json --out sweep.csv --workers 4
+
+Runs are identified by a hash of their settings, seed and generation
+count. Identical runs in a spec are run once, and a sweep pointed at an
+existing CSV skips every run already in it, so an interrupted sweep resumes
+where it stopped (and extending the spec only runs what is new).
+"""
+
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import config
+from simulation import Simulation
+
+MODES = ('grid', 'random')
+METRICS = ('best_fitness', 'mean_fitness', 'best_ever_fitness', 'food_eaten', 'survivors', 'seconds')
+
+
+def _cast(name, value):
+    # A sampled or listed value as the type of the config default
+    if name not in config.TUNABLES:
+        raise ValueError(f"Unknown setting: {name!r}")
+    default = getattr(config, name)
+    if isinstance(default, bool):
+        return bool(value)
+    if isinstance(default, int):
+        return int(round(value))
+    return type(default)(value)
+
+
+def _sample(name, dist, rng):
+    if isinstance(dist, list):
+        dist = {'choice': dist}
+    (kind, arg), = dist.items()
+    if kind == 'uniform':
+        return _cast(name, rng.uniform(*arg))
+    if kind == 'log_uniform':
+        return _cast(name, float(np.exp(rng.uniform(np.log(arg[0]), np.log(arg[1])))))
+    if kind == 'choice':
+        return _cast(name, arg[int(rng.integers(len(arg)))])
+    raise ValueError(f"Unknown distribution for {name}: {kind!r} (choose from uniform, log_uniform, choice)")
+
+
+def configurations(spec):
+    # The spec's settings overrides, one dict per configuration
+    base = {name: _cast(name, value) for name, value in spec.get('base', {}).items()}
+    params = spec.get('params', {})
+    mode = spec.get('mode', 'grid')
+    if mode == 'grid':
+        names = sorted(params)
+        combos = itertools.product(*([_cast(name, v) for v in params[name]] for name in names))
+        return [dict(base, **dict(zip(names, values))) for values in combos]
+    if mode == 'random':
+        rng = np.random.default_rng(spec.get('sample_seed', 0))
+        return [dict(base, **{name: _sample(name, params[name], rng) for name in sorted(params)})
+                for _ in range(spec.get('samples', 10))]
+    raise ValueError(f"Unknown sweep mode: {mode!r} (choose from {', '.join(MODES)})")
+
+
+def run_id(overrides, seed, generations):
+    # Stable id of one run: same settings, seed and length -> same id
+    key = json.dumps({'settings': overrides, 'seed': seed, 'generations': generations}, sort_keys=True)
+    return hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+
+
+def expand(spec):
+    # (id, overrides, seed, generations) for every distinct run in the spec
+    generations = spec.get('generations', config.GENERATIONS)
+    if generations < 1:
+        raise ValueError("A sweep needs at least one generation per run")
+    runs = {}
+    for overrides in configurations(spec):
+        config.Settings(**overrides)  # reject unknown names before anything runs
+        for seed in spec.get('seeds', [0]):
+            rid = run_id(overrides, seed, generations)
+            runs.setdefault(rid, (rid, overrides, seed, generations))
+    return list(runs.values())
+
+
+def run_one(overrides, seed, generations):
+    # One sweep run; executes in a worker process
+    start = time.perf_counter()
+    sim = Simulation(verbose=False, seed=seed, settings=config.Settings(**overrides))
+    best_ever = -np.inf
+    for _ in range(generations):
+        sim.run_generation()
+        stats = sim.evolve()
+        best_ever = max(best_ever, stats['best_fitness'])
+    return {
+        'best_fitness': stats['best_fitness'],
+        'mean_fitness': stats['mean_fitness'],
+        'best_ever_fitness': best_ever,
+        'food_eaten': stats['food_eaten'],
+        'survivors': stats['survivors'],
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+
+
+def _columns(spec):
+    names = sorted(set(spec.get('params', {})) | set(spec.get('base', {})))
+    return ['run_id', 'seed', 'generations'] + names + list(METRICS)
+
+
+def completed(path, columns):
+    # Ids of the runs already in a results file written for the same columns
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return set()
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        if header != columns:
+            raise ValueError(f"{path} has columns {header}, not {columns}; use another --out for this spec")
+        return {row[0] for row in reader if row}
+
+
+def sweep(spec, out, workers=None, on_result=None):
+    # Run every run of `spec` not yet in `out`, appending a row as each
+    # finishes; returns the number of runs done. on_result(row) sees each row
+    columns = _columns(spec)
+    done = completed(out, columns)
+    todo = [run for run in expand(spec) if run[0] not in done]
+    if not todo:
+        return 0
+
+    new_file = not os.path.exists(out) or os.path.getsize(out) == 0
+    with open(out, 'a', newline='') as f, ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        writer = csv.DictWriter(f, columns)
+        if new_file:
+            writer.writeheader()
+        futures = {pool.submit(run_one, overrides, seed, generations): (rid, overrides, seed, generations)
+                   for rid, overrides, seed, generations in todo}
+        for future in as_completed(futures):
+            rid, overrides, seed, generations = futures[future]
+            row = dict(overrides, run_id=rid, seed=seed, generations=generations, **future.result())
+            writer.writerow(row)
+            f.flush()
+            if on_result:
+                on_result(row)
+    return len(todo)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='sweep', description='Run a parameter sweep over config settings.')
+    parser.add_argument('spec', help='JSON sweep spec')
+    parser.add_argument('--out', default='sweep.csv', help='results CSV; runs already in it are skipped')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--dry-run', action='store_true', help='list the runs still to do and exit')
+    args = parser.parse_args(argv)
+
+    with open(args.spec) as f:
+        spec = json.load(f)
+    runs = expand(spec)
+    done = completed(args.out, _columns(spec))
+    todo = [run for run in runs if run[0] not in done]
+    print(f"{len(runs)} runs, {len(runs) - len(todo)} already in {args.out}")
+    if args.dry_run:
+        for rid, overrides, seed, generations in todo:
+            print(rid, seed, json.dumps(overrides, sort_keys=True))
+        return
+
+    def on_result(row):
+        print(f"{row['run_id']} seed={row['seed']} best={row['best_fitness']:.1f} "
+              f"mean={row['mean_fitness']:.1f} ({row['seconds']:.1f}s)", flush=True)
+
+    sweep(spec, args.out, args.workers, on_result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+
+"""Live telemetry for running evolutions over HTTP and WebSocket.
+
+``TelemetryServer`` runs an asyncio server on a background thread, bound to
+localhost by default, next to the (synchronous) simulation:
+
+    GET /            index of the endpoints
+    GET /stats       the latest generation record (stats + phase timings)
+    GET /history     the last ``history`` records
+    GET /elite       the current elite genome as JSON
+    GET /elite.npy   the same weights as a .npy file
+    GET /ws          WebSocket pushing every new record as a JSON text frame
+
+The simulation thread only ever calls ``publish`` and ``set_elite``, which
+hand data to the event loop without waiting on it. Every WebSocket client
+gets its own bounded queue; when a slow client's queue is full the oldest
+record is dropped (and counted), so no client can hold up the run or grow
+memory without bound. Only the standard library is used.
+"""
+
+import asyncio
+import base64
+import collections
+import hashlib
+import io
+import json
+import struct
+import threading
+import numpy as np
+import config
+
+_WS_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+_MAX_HEADER_BYTES = 16384
+
+
+def _frame(payload, opcode=0x1):
+    # Unmasked server->client WebSocket frame
+    head = bytes([0x80 | opcode])
+    size = len(payload)
+    if size < 126:
+        head += bytes([size])
+    elif size < 1 << 16:
+        head += bytes([126]) + struct.pack('>H', size)
+    else:
+        head += bytes([127]) + struct.pack('>Q', size)
+    return head + payload
+
+
+async def _read_frame(reader):
+    # (opcode, payload) of the next client frame; clients always mask
+    b0, b1 = await reader.readexactly(2)
+    size = b1 & 0x7f
+    if size == 126:
+        size, = struct.unpack('>H', await reader.readexactly(2))
+    elif size == 127:
+        size, = struct.unpack('>Q', await reader.readexactly(8))
+    mask = await reader.readexactly(4) if b1 & 0x80 else b'\0\0\0\0'
+    data = await reader.readexactly(size)
+    payload = bytes(byte ^ mask[i % 4] for i, byte in enumerate(data))
+    return b0 & 0x0f, payload
+
+
+class TelemetryServer:
+    def __init__(self, host='127.0.0.1', port=config.TELEMETRY_PORT, queue_size=config.TELEMETRY_QUEUE_SIZE,
+                 history=1000):
+        # port=0 picks a free port; the bound one is in self.port after start()
+        self.host = host
+        self.port = port
+        self.queue_size = queue_size
+        self.history = collections.deque(maxlen=history)
+        self.elite = None  # (generation, fitness, weights) snapshot
+        self.dropped = 0
+        self.clients = set()
+        self.loop = None
+        self.thread = None
+        self._ready = threading.Event()
+        self._error = None
+
+    # Simulation side
+
+    def start(self):
+        self.thread = threading.Thread(target=self._serve, name='telemetry', daemon=True)
+        self.thread.start()
+        self._ready.wait()
+        if self._error:
+            raise self._error
+        return self
+
+    def publish(self, record):
+        # Queue a JSON-serialisable generation record for every client
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._broadcast, json.dumps(record))
+
+    def set_elite(self, weights, fitness, generation):
+        self.elite = (generation, float(fitness), np.array(weights, dtype=float))
+
+    def close(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._stop.set)
+            self.thread.join()
+            self.loop = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # Event loop side
+
+    def _serve(self):
+        try:
+            asyncio.run(self._main())
+        except BaseException as e:
+            self._error = e
+            self._ready.set()
+
+    async def _main(self):
+        self._stop = asyncio.Event()
+        self._handlers = set()
+        server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = server.sockets[0].getsockname()[1]
+        self.loop = asyncio.get_running_loop()
+        self._ready.set()
+        async with server:
+            await self._stop.wait()
+        # Let open connections wind down before the loop goes away
+        for task in self._handlers:
+            task.cancel()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+
+    def _broadcast(self, text):
+        self.history.append(text)
+        for queue, _ in self.clients:
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(text)
+
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        try:
+            await self._request(reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self._handlers.discard(task)
+            writer.close()
+
+    async def _request(self, reader, writer):
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.LimitOverrunError:
+            return
+        if len(head) > _MAX_HEADER_BYTES:
+            return
+        lines = head.decode('latin-1').split('\r\n')
+        method, path = (lines[0].split(' ') + ['', ''])[:2]
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if method != 'GET':
+            await self._respond(writer, 405, b'{"error": "method not allowed"}')
+        elif path == '/ws' and headers.get('upgrade', '').lower() == 'websocket':
+            await self._websocket(reader, writer, headers)
+        else:
+            await self._http(writer, path)
+
+    async def _respond(self, writer, status, body, content_type='application/json'):
+        reason = {200: 'OK', 404: 'Not Found', 405: 'Method Not Allowed'}.get(status, '')
+        writer.write(f'HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\n'
+                     f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body)
+        await writer.drain()
+
+    async def _http(self, writer, path):
+        path = path.split('?')[0]
+        if path == '/':
+            body = {'endpoints': ['/stats', '/history', '/elite', '/elite.npy', '/ws'],
+                    'clients': len(self.clients), 'dropped': self.dropped}
+            await self._respond(writer, 200, json.dumps(body).encode())
+        elif path == '/stats':
+            await self._respond(writer, 200, (self.history[-1] if self.history else '{}').encode())
+        elif path == '/history':
+            await self._respond(writer, 200, ('[' + ','.join(self.history) + ']').encode())
+        elif path in ('/elite', '/elite.npy') and self.elite is not None:
+            generation, fitness, weights = self.elite
+            if path == '/elite':
+                body = json.dumps({'generation': generation, 'fitness': fitness, 'weights': weights.tolist()})
+                await self._respond(writer, 200, body.encode())
+            else:
+                buffer = io.BytesIO()
+                np.save(buffer, weights)
+                await self._respond(writer, 200, buffer.getvalue(), 'application/octet-stream')
+        else:
+            await self._respond(writer, 404, b'{"error": "not found"}')
+
+    async def _websocket(self, reader, writer, headers):
+        accept = base64.b64encode(hashlib.sha1(headers.get('sec-websocket-key', '').encode() + _WS_GUID).digest())
+        writer.write(b'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                     b'Sec-WebSocket-Accept: ' + accept + b'\r\n\r\n')
+        await writer.drain()
+
+        queue = asyncio.Queue(self.queue_size)
+        if self.history:
+            queue.put_nowait(self.history[-1])
+        client = (queue, writer)
+        self.clients.add(client)
+        listener = asyncio.ensure_future(self._listen(reader, writer))
+        try:
+            while not listener.done():
+                getter = asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait({getter, listener}, return_when=asyncio.FIRST_COMPLETED)
+                if getter not in done:
+                    getter.cancel()
+                    break
+                writer.write(_frame(getter.result().encode()))
+                await writer.drain()
+        finally:
+            self.clients.discard(client)
+            listener.cancel()
+
+    async def _listen(self, reader, writer):
+        # Answer pings; return when the client closes or goes away
+        try:
+            while True:
+                opcode, payload = await _read_frame(reader)
+                if opcode == 0x8:
+                    writer.write(_frame(payload[:2], 0x8))
+                    return
+                if opcode == 0x9:
+                    writer.write(_frame(payload, 0xA))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return
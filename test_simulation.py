@@ -0,0 +1,27 @@
+import numpy as np
+import config
+from simulation import Simulation
+
+
+def contested_sim(food_conflict):
+    # Two bots sitting on the same food item, far from every other item
+    settings = config.Settings(FOOD_CONFLICT=food_conflict, POPULATION_SIZE=3, FOOD_COUNT=1)
+    sim = Simulation(verbose=False, seed=1, settings=settings)
+    state = sim.state
+    state.pos[:2] = sim.food_pos[0]
+    state.pos[2] = sim.food_pos[0] + 500
+    state.energy[:] = 0
+    sim.eat_food(state.compact())
+    return state
+
+
+def test_split_shares_energy_and_credit():
+    state = contested_sim('split')
+    np.testing.assert_array_equal(state.food_eaten, [0.5, 0.5, 0])
+    np.testing.assert_array_equal(state.energy, [25, 25, 0])
+
+
+def test_nearest_gives_the_item_to_one_bot():
+    state = contested_sim('nearest')
+    np.testing.assert_array_equal(state.food_eaten, [1, 0, 0])
+    np.testing.assert_array_equal(state.energy, [50, 0, 0])
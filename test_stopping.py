@@ -0,0 +1,28 @@
+import config
+from simulation import Simulation
+from stopping import parse_rules
+
+
+def decided_sim(elitism_count, dead):
+    # A world where the first `dead` bots died having eaten far more food
+    # than any living bot could still reach
+    settings = config.Settings(ELITISM_COUNT=elitism_count, POPULATION_SIZE=10)
+    sim = Simulation(verbose=False, seed=1, settings=settings)
+    state = sim.state
+    state.alive[:dead] = False
+    state.food_eaten[:dead] = 1e6
+    state.compact()
+    return sim
+
+
+def test_elites_waits_for_the_runs_elitism_count():
+    rule, = parse_rules(['elites'])
+    # The module default (2) would already be decided here; the run's 5 isn't
+    assert not rule.should_stop(decided_sim(5, dead=3), 10, 100)
+    assert rule.should_stop(decided_sim(5, dead=5), 10, 100)
+    assert rule.should_stop(decided_sim(2, dead=3), 10, 100)
+
+
+def test_elites_explicit_count_overrides_settings():
+    rule, = parse_rules(['elites:3'])
+    assert rule.should_stop(decided_sim(5, dead=3), 10, 100)
@@ -0,0 +1,244 @@
+
+"""Large arenas generated lazily in fixed-size chunks.
+
+The classic world is one screen-sized arena holding every food item and
+obstacle. A ChunkedWorld of ``width`` x ``height`` (centred on the origin,
+like the classic one) is instead cut into square chunks of ``chunk_size``,
+and a chunk only exists while a living bot is within sensing reach of it:
+
+- Obstacles are drawn from the world seed and the chunk's coordinates and
+  bounce inside their home chunk, so their position at any time is a
+  closed-form function of the step count. An unloaded chunk needs no state
+  and a reloaded one is exactly where it would have been.
+- Food is drawn from (seed, generation, chunk) and respawns inside its
+  chunk from that chunk's own generator. A chunk that unloads forgets what
+  was eaten in it.
+
+Only loaded chunks are simulated: their obstacles and food are gathered
+into the same arrays and spatial grids the Simulation uses for the classic
+world. A newly needed chunk is appended to them, so only its own items are
+bucketed. Chunks no longer needed stay loaded until they outnumber the
+needed ones; then a single rebuild drops them all. Rebuilds therefore cost
+amortized O(1) per chunk loaded, and memory stays proportional to the area
+around living bots (at most about twice it), not to the arena.
+"""
+
+import math
+import numpy as np
+import config
+from spatial import SpatialGrid
+
+# Largest obstacle radius; obstacles reach this far out of their centre
+MAX_OBSTACLE_RADIUS = 30.0
+# Gap kept between food and the outer walls, as in the classic world
+FOOD_MARGIN = 50.0
+
+
+def uses_chunks(settings=None):
+    # Whether `settings` asks for a ChunkedWorld instead of the classic arena
+    settings = settings if settings is not None else config
+    return settings.WORLD_WIDTH > 0 or settings.WORLD_HEIGHT > 0
+
+
+def arena_size(settings=None):
+    # (width, height) of the arena the bots live in
+    settings = settings if settings is not None else config
+    return (settings.WORLD_WIDTH or settings.SCREEN_WIDTH, settings.WORLD_HEIGHT or settings.SCREEN_HEIGHT)
+
+
+class Chunk:
+    # The generated contents of one chunk
+    __slots__ = ('key', 'food_rng', 'food_lo', 'food_hi', 'food_pos', 'food_energy',
+                 'obstacle_origin', 'obstacle_vel', 'obstacle_radius', 'obstacle_lo', 'obstacle_span')
+
+
+class ChunkedWorld:
+    def __init__(self, width, height, seed=0, chunk_size=None, food_per_chunk=None, obstacles_per_chunk=None,
+                 settings=None):
+        self.settings = settings = settings if settings is not None else config
+        self.width = float(width)
+        self.height = float(height)
+        self.half = (self.width / 2, self.height / 2)
+        self.seed = seed
+        self.chunk_size = float(settings.WORLD_CHUNK_SIZE if chunk_size is None else chunk_size)
+        self.food_per_chunk = settings.WORLD_CHUNK_FOOD if food_per_chunk is None else food_per_chunk
+        self.obstacles_per_chunk = settings.WORLD_CHUNK_OBSTACLES if obstacles_per_chunk is None else obstacles_per_chunk
+        self.columns = max(1, math.ceil(self.width / self.chunk_size))
+        self.rows = max(1, math.ceil(self.height / self.chunk_size))
+        # Chunks around a bot's own that must be loaded for its rays to see
+        # every obstacle in range
+        self.reach = max(1, math.ceil((settings.SIGHT_RANGE + MAX_OBSTACLE_RADIUS) / self.chunk_size))
+
+        # Bots start near the left wall and swim towards the right one
+        self.start_x = -self.half[0] + 100
+        self.target_pos = (self.half[0] - 50, 0)
+
+        self.generation = 0
+        self.time = 0
+        self.loads = 0
+        self.peak_chunks = 0
+        self.chunks = {}
+        self.keys = []
+        self._build()
+
+    def chunk_bounds(self, key):
+        # (x0, y0, x1, y1) of chunk (cx, cy), clipped to the arena
+        cx, cy = key
+        x0 = -self.half[0] + cx * self.chunk_size
+        y0 = -self.half[1] + cy * self.chunk_size
+        return x0, y0, min(x0 + self.chunk_size, self.half[0]), min(y0 + self.chunk_size, self.half[1])
+
+    def _generate(self, key):
+        settings = self.settings
+        x0, y0, x1, y1 = self.chunk_bounds(key)
+        chunk = Chunk()
+        chunk.key = key
+
+        rng = np.random.default_rng([self.seed, 0, *key])
+        k = self.obstacles_per_chunk
+        radius = rng.uniform(15, MAX_OBSTACLE_RADIUS, k)
+        lo = np.column_stack([x0 + radius, y0 + radius])
+        span = np.maximum(0.0, np.column_stack([x1 - x0 - 2 * radius, y1 - y0 - 2 * radius]))
+        angle = rng.uniform(0, 2 * math.pi, k)
+        chunk.obstacle_radius = radius
+        chunk.obstacle_lo = lo
+        chunk.obstacle_span = span
+        chunk.obstacle_origin = lo + rng.random((k, 2)) * span
+        chunk.obstacle_vel = np.column_stack([np.cos(angle), np.sin(angle)]) * settings.OBSTACLE_SPEED
+
+        # Food stays FOOD_MARGIN away from the outer walls
+        fx, fy = self.half[0] - FOOD_MARGIN, self.half[1] - FOOD_MARGIN
+        chunk.food_lo = np.array([max(x0, -fx), max(y0, -fy)])
+        chunk.food_hi = np.maximum(chunk.food_lo, [min(x1, fx), min(y1, fy)])
+        chunk.food_rng = np.random.default_rng([self.seed, 1, self.generation, *key])
+        chunk.food_pos = chunk.food_rng.uniform(chunk.food_lo, chunk.food_hi, (self.food_per_chunk, 2))
+        chunk.food_energy = np.full(self.food_per_chunk, float(settings.FOOD_ENERGY_VALUE))
+        self.loads += 1
+        return chunk
+
+    def needed(self, points):
+        # Keys of the chunks within reach of any of the (N, 2) points
+        points = np.reshape(points, (-1, 2))
+        if len(points) == 0:
+            return []
+        cells = np.floor((points + self.half) / self.chunk_size).astype(int)
+        cells = np.unique(np.clip(cells, 0, [self.columns - 1, self.rows - 1]), axis=0)
+        span = np.arange(-self.reach, self.reach + 1)
+        offsets = np.stack(np.meshgrid(span, span), axis=-1).reshape(-1, 2)
+        keys = (cells[:, None, :] + offsets[None, :, :]).reshape(-1, 2)
+        keys = keys[(keys[:, 0] >= 0) & (keys[:, 0] < self.columns) & (keys[:, 1] >= 0) & (keys[:, 1] < self.rows)]
+        return [tuple(key) for key in np.unique(keys, axis=0).tolist()]
+
+    def activate(self, points):
+        # Make sure the chunks around `points` are loaded. Returns True if
+        # the loaded set changed (and the arrays below were extended or
+        # rebuilt)
+        wanted = self.needed(points)
+        new = [key for key in wanted if key not in self.chunks]
+        stale = len(self.keys) - (len(wanted) - len(new))
+        if stale > max(len(wanted), 1):
+            # Drop every chunk no longer needed in one rebuild
+            self._store()
+            self.chunks = {key: self.chunks[key] if key in self.chunks else self._generate(key)
+                           for key in wanted}
+            self.keys = wanted
+            self._build()
+        elif new:
+            chunks = [self._generate(key) for key in new]
+            self.chunks.update(zip(new, chunks))
+            self.keys = self.keys + new
+            self._append(chunks)
+        else:
+            return False
+        self.peak_chunks = max(self.peak_chunks, len(self.keys))
+        return True
+
+    def _store(self):
+        # Write the loaded food (eaten and respawned items) back to its chunks
+        for chunk, start in zip((self.chunks[key] for key in self.keys), self.food_start):
+            chunk.food_pos[:] = self.food_pos[start:start + len(chunk.food_pos)]
+            chunk.food_energy[:] = self.food_energy[start:start + len(chunk.food_energy)]
+
+    def _build(self):
+        # Gather the loaded chunks into flat arrays and spatial grids
+        chunks = [self.chunks[key] for key in self.keys]
+
+        def gather(name, shape):
+            parts = [getattr(chunk, name) for chunk in chunks]
+            return np.concatenate(parts) if parts else np.zeros(shape)
+
+        self.obstacle_origin = gather('obstacle_origin', (0, 2))
+        self.obstacle_vel = gather('obstacle_vel', (0, 2))
+        self.obstacle_radius = gather('obstacle_radius', (0,))
+        self.obstacle_lo = gather('obstacle_lo', (0, 2))
+        self.obstacle_span = gather('obstacle_span', (0, 2))
+        self.obstacle_pos = self.obstacle_positions(self.time)
+        self.food_pos = gather('food_pos', (0, 2))
+        self.food_energy = gather('food_energy', (0,))
+        counts = [len(chunk.food_pos) for chunk in chunks]
+        self.food_start = np.cumsum([0] + counts)[:-1].astype(int)
+        self.food_chunk = np.repeat(np.arange(len(chunks)), counts)
+
+        cell = self.settings.GRID_CELL_SIZE
+        self.obstacle_grid = SpatialGrid(cell, self.obstacle_pos, self.obstacle_radius)
+        self.food_grid = SpatialGrid(cell, self.food_pos)
+
+    def _append(self, chunks):
+        # Add newly loaded chunks to the end of the arrays and grids
+        def extend(current, name):
+            return np.concatenate([current] + [getattr(chunk, name) for chunk in chunks])
+
+        first_obstacle, first_food = len(self.obstacle_radius), len(self.food_pos)
+        self.obstacle_origin = extend(self.obstacle_origin, 'obstacle_origin')
+        self.obstacle_vel = extend(self.obstacle_vel, 'obstacle_vel')
+        self.obstacle_radius = extend(self.obstacle_radius, 'obstacle_radius')
+        self.obstacle_lo = extend(self.obstacle_lo, 'obstacle_lo')
+        self.obstacle_span = extend(self.obstacle_span, 'obstacle_span')
+        self.obstacle_pos = self.obstacle_positions(self.time)
+        self.food_pos = extend(self.food_pos, 'food_pos')
+        self.food_energy = extend(self.food_energy, 'food_energy')
+        counts = [len(chunk.food_pos) for chunk in chunks]
+        self.food_start = np.concatenate([self.food_start, first_food + np.cumsum([0] + counts)[:-1]]).astype(int)
+        first_chunk = len(self.keys) - len(chunks)
+        self.food_chunk = np.concatenate([self.food_chunk, np.repeat(np.arange(first_chunk, len(self.keys)), counts)])
+
+        self.obstacle_grid.extend(self.obstacle_pos[first_obstacle:], self.obstacle_radius[first_obstacle:])
+        self.food_grid.extend(self.food_pos[first_food:])
+
+    def obstacle_positions(self, time):
+        # Obstacles bounce between their chunk's walls: a triangle wave of
+        # period 2 * span along each axis (static if they fill the chunk)
+        span = self.obstacle_span
+        moving = span > 0
+        period = np.where(moving, 2 * span, 1.0)
+        phase = np.mod(self.obstacle_origin - self.obstacle_lo + self.obstacle_vel * time, period)
+        offset = np.where(phase > span, period - phase, phase)
+        return self.obstacle_lo + np.where(moving, offset, self.obstacle_origin - self.obstacle_lo)
+
+    def update(self, points):
+        # One step: advance time, load/drop chunks around the living bots'
+        # positions and move the loaded obstacles
+        self.time += 1
+        self.activate(points)
+        self.obstacle_pos[:] = self.obstacle_positions(self.time)
+        self.obstacle_grid.move(np.arange(len(self.obstacle_pos)), self.obstacle_pos)
+
+    def respawn_foods(self, ids):
+        # Respawn loaded food items `ids` elsewhere in their own chunks, one
+        # draw per chunk involved
+        ids = np.asarray(ids)
+        chunk_ids = self.food_chunk[ids]
+        for c in np.unique(chunk_ids):
+            chunk = self.chunks[self.keys[c]]
+            mine = ids[chunk_ids == c]
+            self.food_pos[mine] = chunk.food_rng.uniform(chunk.food_lo, chunk.food_hi, (len(mine), 2))
+        self.food_energy[ids] = self.settings.FOOD_ENERGY_VALUE
+        self.food_grid.move(ids, self.food_pos[ids])
+
+    def reset(self, generation):
+        # Fresh food for a new generation; obstacles keep moving
+        self.generation = generation
+        self.chunks = {}
+        self.keys = []
+        self.peak_chunks = 0
+        self._build()